@@ -64,8 +64,14 @@ from re import I
 import io
 import json
 import copy
+import threading
+import types
+import weakref
+from collections import OrderedDict
 
 import ndlabdblink as dl
+import ndlabframe
+import ndlaborm
 import sys
 
 # the uncertainities (https://pythonhosted.org/uncertainties/)
@@ -74,16 +80,21 @@ from uncertainties import *  #
 this = sys.modules[__name__]
 
 db_path = 'ndlab_db.s3db'
-dblink = dl.Dblink(db_path)
-
-_filter = ""
 
 DEFAULT = "NO_PARAM";
-last_fields = ''
-last_filter = ''
 
 CSV_SEP = ','
+
+"""Maximum number of placeholders in a query of the bulk lookups, e.g. :py:func:`nuclides_by_id`. The limit of sqlite before 3.32"""
+IN_PLACEHOLDERS = 999
+"""Number of entities each session keeps alive in its identity map, see :py:class:`Identity_map`. Beyond this, an entity stays mapped only while referenced elsewhere"""
+IDENTITY_SIZE = 5000
 ERROR_FILTER_NOT_VALID = "Fields or Filter not valid, check the rules"
+ERROR_PREFETCH_NOT_VALID = "Link not valid for prefetch, see the _prefetch of the class"
+ERROR_FIELDS_NOT_VALID = "Fields not valid, see the _columns of the class"
+
+"""The names of the radiations of a :py:class:`L_decay`, to :py:func:`prefetch` them all"""
+RADIATIONS = ("gammas", "alphas", "annihil", "betas_m", "anti_nus", "nus", "betas_p", "xs", "convels", "augers")
 
 help = ("See https://iaea-nds.github.io/ndlab/interrogation.html on how to construct the fields and filter parameters\n\n"
         
@@ -118,6 +129,150 @@ if __spec__ is not None:
         sys.modules[name] = sys.modules[__spec__.name]
         __spec__.name = name
 
+class Session:
+    """The state of a user of the package: the database connection, the filter appended to each query, and the last query
+
+    The module-level functions work on the session active in the calling thread, which is the default session
+    unless another one has been activated with a :code:`with` block. 
+    Threads that query concurrently should each use their own session:
+
+    | with Session() as s:
+    |     nucs = nuclides("NUCLIDE.Z > 50")
+    |     levs = s.levels("LEVEL.ENERGY > 1000")
+
+    Any public function of this module can be called as a method of the session, and runs within it.
+    Entities remember the session that created them, and use it to follow their links (e.g. :py:meth:`ndlab.Nuclide.levels`)
+
+    :ivar Dblink dblink: the link to the database, owned by this session
+    :ivar Identity_map identity_map: the entities already created by this session
+    :ivar bool lazy: whether the entities decode each attribute from their row at its first access, instead of all of them when created
+    :ivar str last_fields: fields of the last query
+    :ivar str last_filter: filter of the last query
+    """
+
+    def __init__(self, db_path = None, lazy = False, **options):
+        """
+        Args:
+            db_path (str): path to the database, :py:data:`ndlab.db_path` if not given
+            lazy (bool): True, the entities keep their row and decode an attribute at its first access,
+                         e.g. reading the energies of many gammas does not decode their other attributes
+            options: passed to :py:class:`ndlabdblink.Dblink`, e.g. pool_size
+        """
+        self.db_path = this.db_path if db_path is None else db_path
+        self.lazy = lazy
+        self.dblink = dl.Dblink(self.db_path, **options)
+        self.identity_map = Identity_map(IDENTITY_SIZE)
+        self._filter = ""
+        self.last_fields = ''
+        self.last_filter = ''
+
+    def __enter__(self):
+        _sessions().append(self)
+        return self
+
+    def __exit__(self, exc_type, exc_value, exc_tb):
+        _sessions().pop()
+        return False
+
+    def __getattr__(self, name):
+        # the public functions of the module, run within this session
+        function = getattr(this, name, None)
+        if(name.startswith("_") or not isinstance(function, types.FunctionType)):
+            raise AttributeError("'Session' object has no attribute '" + name + "'")
+
+        def in_session(*args, **kwargs):
+            with self:
+                return function(*args, **kwargs)
+
+        return in_session
+
+class Identity_map:
+    """The entities created by a session, by class and primary key, so that each row is instanciated once
+
+    Following the links of different entities to the same one gives the same instance, e.g. all the levels of 135XE
+    and all its gammas return the same :py:class:`Nuclide` from their nuclide property, populated once and holding the links already followed.
+    Only the classes with :code:`_identity` set are mapped, those whose rows are told apart by their key columns.
+
+    The entities are held by weak references, and the last used ones also by strong references, so that those
+    no more referenced elsewhere can be collected once they fall out of the most recent ones
+
+    :ivar int size: the number of most recent entities kept alive
+    """
+
+    def __init__(self, size):
+        """
+        Args:
+            size (int): the number of most recent entities kept alive
+        """
+        self.size = size
+        self._entities = weakref.WeakValueDictionary()
+        self._recent = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """The entity mapped to a key, None if not mapped
+
+        Args:
+            key (tuple): the class and the primary key of the entity
+        """
+        with self._lock:
+            entity = self._entities.get(key)
+            if(entity is not None):
+                self._keep(key, entity)
+            return entity
+
+    def add(self, key, entity):
+        """Maps an entity, unless another one is already mapped to its key
+
+        Returns:
+            Object: the entity mapped to the key
+        """
+        with self._lock:
+            entity = self._entities.setdefault(key, entity)
+            self._keep(key, entity)
+            return entity
+
+    def _keep(self, key, entity):
+        self._recent[key] = entity
+        self._recent.move_to_end(key)
+        if(len(self._recent) > self.size):
+            self._recent.popitem(last = False)
+
+    def clear(self):
+        """Forgets all the entities, the next queries create new instances
+        """
+        with self._lock:
+            self._entities.clear()
+            self._recent.clear()
+
+    def __len__(self):
+        return len(self._entities)
+
+# the sessions activated in each thread, the last one is in use
+_local = threading.local()
+
+def _sessions():
+    """ The stack of sessions activated in the calling thread
+    """
+    try:
+        return _local.sessions
+    except AttributeError:
+        _local.sessions = []
+        return _local.sessions
+
+def _session():
+    """ The session in use in the calling thread
+
+    Returns:
+        Session: the last session activated in this thread, or the default one 
+    """
+    stack = _sessions()
+    return stack[-1] if stack else default_session
+
+default_session = Session(db_path)
+# the link of the default session, kept for the code using it directly
+dblink = default_session.dblink
+
 def _float_check(val):
     """ Check if a value retrieved from the database is a float
 
@@ -129,6 +284,9 @@ def _float_check(val):
         or
         None: no conversion to float possible    
     """
+    # values decoded straight from the db are already numbers, or None for null
+    if val is None or val.__class__ is float:
+        return val
     try:
         return float(val)
     except:
@@ -145,7 +303,8 @@ def _int_check(val):
         or
         None: no conversion to float possible    
     """
-
+    if val is None or val.__class__ is int:
+        return val
     try:
         return int(val)
     except:
@@ -161,6 +320,7 @@ class Property:
 
     Upper class with only the name of the property
     """
+    __slots__ = ("_name_",)
 
     def __init__(self, name = ''):
         self.name = name
@@ -191,6 +351,7 @@ class Nominal(Property):
 
     Quantities without magnitude
     """
+    __slots__ = ("nominal",)
 #    value = None
     def __init__(self, name = ''):
         super(Nominal, self).__init__(name)
@@ -275,6 +436,8 @@ class Quantity(Nominal):
     """
 
 
+    __slots__ = ("value", "unc_num", "unc", "operator")
+
     sep = CSV_SEP
     # name is the key to be used in populate
     def __init__(self, name = ''):
@@ -299,22 +462,24 @@ class Quantity(Nominal):
         
         """
 
+        # data is either the json from the server, with all values as strings ('None' for null),
+        # or a row decoded straight from the db, with numbers and None
         if self.name in data:
             self.nominal = data[self.name ]
-            if(data[self.name] != 'None'):
-                self.value = _float_check(data[self.name])
+            if(self.nominal is not None and self.nominal != 'None'):
+                self.value = _float_check(self.nominal)
        
         if self.name + "_unc" in data:
             self.unc = (data[self.name+ "_unc"])
-            if(data[self.name + "_unc"] != 'None'):
-                self.unc_num = _float_check(data[self.name + "_unc"])
+            if(self.unc is not None and self.unc != 'None'):
+                self.unc_num = _float_check(self.unc)
             else:
                 self.unc = "0"
                 self.unc_num = 0
  
         if self.name + "_limit" in data:
             self.operator = data[self.name + "_limit"]
-            if (self.operator == ''):
+            if (self.operator == '' or self.operator is None or self.operator == 'None'):
                   self.operator = Operator.eq
 
         if self.value == None:
@@ -477,23 +642,152 @@ class Quantity(Nominal):
         return ("" if self.operator == Operator.eq else self.operator) +  " " + str(self.ufloat())
 
 
+def _decode(data, column, conversion):
+    """The value of an attribute of an entity from a row, see :py:class:`Ndm_base`
+
+    Args:
+        data (Object): the row, or the json structure from the server
+        column (str): the column, or the first part of the columns of a Quantity
+        conversion (Object): a function applied to the value, None for the value as it is, Quantity for a Quantity
+    """
+    if(conversion is Quantity):
+        return Quantity(column)._populate(data)
+    value = data[column]
+    return value if conversion is None else conversion(value)
+
+class _Cached:
+    """An attribute of an entity kept in its _cache, e.g. the levels of a nuclide once followed
+
+    Reads None until set. The _cache is allocated when the first attribute is set, 
+    the entities whose links are never followed do without
+    """
+    __slots__ = ("name",)
+
+    def __init__(self, name):
+        self.name = name
+
+    def __get__(self, obj, objtype = None):
+        if(obj is None): return self
+        cache = obj._cache
+        return None if cache is None else cache.get(self.name)
+
+    def __set__(self, obj, value):
+        if(obj._cache is None): obj._cache = {}
+        obj._cache[self.name] = value
+
 class Ndm_base():
     """Base class of the Nuclar Data Model
 
+    The instances have no __dict__: each class lists its attributes in __slots__, and the attributes holding 
+    the links already followed in _caches, see :py:class:`_Cached`. 
+    An attribute not set yet reads its value in _defaults, None unless given otherwise
+
+    The attributes are decoded from the columns of a row as given in _columns, all at once by :py:meth:`_populate`, 
+    or each at its first access for the instances of a lazy :py:class:`Session`, which keep the row instead
+
     Attributes:
        _csv_title (str): the title of the csv representation of this class
 
     """
-    _csv_title = '' 
+    # _session: the session that created the instance, None for instances created by the user
+    __slots__ = ("__weakref__", "_session", "_cache", "_row", "myfilter", "pk")
+    _caches = ()
+    _defaults = {"_session" : None, "_cache" : None, "_row" : None, "myfilter" : "", "pk" : ""}
+    # attribute -> (column, conversion): None for the value as it is, Quantity for the quantity whose columns start with column
+    _columns = {}
+    # the attributes giving the pk, joined by -
+    _pk_attrs = ()
+
+    _csv_title = ''
+    # the columns giving the pk of the rows, for the classes whose instances are shared through the Identity_map
+    _identity = None
+    # the links that prefetch can load: name -> (Relation, attribute holding the result, whether it holds the first instance only)
+    _prefetch = {}
+    # column -> attribute, for the columns giving the keys of a relation and stored under another name, see _keys
+    _column_attrs = {}
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        for name in cls.__dict__.get("_caches", ()):
+            setattr(cls, name, _Cached(name))
+        # the defaults of the parent, then None for the new attributes, unless given
+        defaults = dict(cls.__base__._defaults)
+        defaults.update({name : None for name in cls.__dict__.get("__slots__", ())})
+        defaults.update(cls.__dict__.get("_defaults", {}))
+        cls._defaults = defaults
+        columns = dict(cls.__base__._columns)
+        columns.update(cls.__dict__.get("_columns", {}))
+        cls._columns = columns
 
     def __init__(self):
-        self.myfilter = ''
-        self.pk = ''
+        self._cache = None
+        self._row = None
+        # the quantities of an instance created by the user, to be filled
+        for name, (column, conversion) in self._columns.items():
+            if(conversion is Quantity):
+                setattr(self, name, Quantity(column))
 
-    def _populate(self,data):
-        """ takes a json structure and populates the Quantities of this class, as well as the other variables 
+    @classmethod
+    def _new(cls, row = None):
+        """An instance to populate from a row, without the quantities of __init__
+
+        Args:
+            row (Object): the row kept by a lazy instance, decoded by __getattr__. None for an instance populated by _populate
         """
-        pass
+        obj = cls.__new__(cls)
+        obj._cache = None
+        obj._row = row
+        return obj
+
+    def __getattr__(self, name):
+        # only for the attributes not set
+        cls = type(self)
+        row = self._row
+        if(row is not None):
+            if(name in cls._columns):
+                value = _decode(row, *cls._columns[name])
+                setattr(self, name, value)
+                return value
+            if(name == "pk"):
+                self.pk = "-".join([str(getattr(self, attr)) for attr in cls._pk_attrs])
+                return self.pk
+        if(name in cls._defaults):
+            return cls._defaults[name]
+        descriptor = getattr(cls, name, None)
+        if(hasattr(descriptor, "__get__")):
+            # e.g. a property failing with an AttributeError of its own: raised again, instead of reported as a missing attribute
+            return descriptor.__get__(self, cls)
+        raise AttributeError("'" + cls.__name__ + "' object has no attribute '" + name + "'")
+
+    def _generator(self, orm_table, nl_class_name, filter = '', params = ()):
+        """ :py:meth:`ndlab._generator` run within the session that created this instance
+        """
+        with (self._session or _session()):
+            return _generator(orm_table, nl_class_name, filter, params)
+
+    def _populate(self,data, names = None):
+        """ takes a json structure and populates the Quantities of this class, as well as the other variables, see _columns
+
+        Args:
+            data (Object): the row, or the json structure from the server
+            names (list): the only attributes to populate, None for all of them. The pk is set when they include those giving it
+        """
+        columns = self._columns
+        for name in (columns if names == None else names):
+            setattr(self, name, _decode(data, *columns[name]))
+        if(names == None or all([attr in names for attr in self._pk_attrs])):
+            self.pk = "-".join([str(getattr(self, attr)) for attr in self._pk_attrs])
+
+    def _keys(self, relation):
+        """The values of this instance for the keys of a :py:class:`ndlaborm.Relation`
+        """
+        return tuple([getattr(self, self._column_attrs.get(column, column)) for column in relation.source])
+
+    def _related(self, relation):
+        """ :py:meth:`ndlab._related` with the keys of this instance, run within the session that created it
+        """
+        with (self._session or _session()):
+            return _related(relation, self._keys(relation))
 
     def _join_filter(self,filter, fk_filter):
         """Joins the filter specified by the user with the foreign key to follow the link to another class.
@@ -517,11 +811,7 @@ class Ndm_base():
         else:
             _filter = self.myfilter
 
-
-        idx = _filter.find("ORDER")
-        if(idx > 0):
-            _filter = _filter[0 : idx]
-        
+        # an ORDER BY in the filters is moved after all the conditions when building the query, see :py:meth:`ndlaborm.Sqlbuilder.rewrite`
         if(_filter != ''  and fk_filter != ''):
             _filter = _filter + " AND " + fk_filter
         else:
@@ -551,7 +841,7 @@ class Ndm_base():
         return filter    
 
 
-    def _property_filler(self, property_name, func_name, filter, fk_filter, skip_prev_filter=False):
+    def _property_filler(self, property_name, func_name, filter, fk_filter, skip_prev_filter=False, params = (), fk_params = ()):
         """intialises an instance variable, like :py:meth:`ndlab.Nuclide.levels` for a :py:class:`ndlab.Nuclide`
 
         It uses reflection, the name of the variable to be set, the name of the function that 
@@ -563,8 +853,10 @@ class Ndm_base():
             property_name (str): name of the property to be intialised
             func_name (str): name of the function in this module that  performs the task
             filter (str): filter passed to the function by the user
-            fk_filter (str): str: foreign key(s) to be appended to the filter
-            skip_prev_filter (bool) : False , do not append the exisiting filter 
+            fk_filter (Object): str: foreign key(s) to be appended to the filter, or the :py:class:`ndlaborm.Relation` to follow
+            skip_prev_filter (bool) : False , do not append the exisiting filter
+            params (tuple): values of the ? placeholders in filter
+            fk_params (tuple): values of the ? placeholders in fk_filter
 
         Returns: 
         
@@ -573,28 +865,43 @@ class Ndm_base():
 
         """
         if(filter == DEFAULT): filter = ""
-        
+
+        relation = None
+        if(isinstance(fk_filter, ndlaborm.Relation)):
+            relation = fk_filter
+            fk_filter = relation.filter
+            fk_params = self._keys(relation)
+
         # pointer to the property from its name
         property = getattr(self,property_name)
         # pointer to the previous filter from its name
         prev_filter = getattr(self,(property_name + "_filter"))
         # whether the filter has changed
         filter = filter if skip_prev_filter else   self._check_filter(filter, prev_filter)
-        
+        # the same filter with other values is another filter
+        params = tuple(params)
+        key = (filter, params) if len(params) > 0 else filter
+
         # lazy creator: only if not assigned yet, or if the filter has chenged
-        if(property == None or prev_filter != filter ):
+        if(property == None or prev_filter != key ):
             # pointer to the function from its name
             function = getattr(this,func_name)
             # assign the result to the property
           
             #property = function(self._join_filter(filter, fk_filter))
 
-            property = function(  filter + ("" if filter == "" else " AND ") + fk_filter)
+            with (self._session or _session()):
+                if(relation != None and filter == "" and len(params) == 0):
+                    # nothing from the user, the relation is already compiled
+                    property = _related(relation, fk_params)
+                else:
+                    # the user's placeholders come first in the joined filter, so do their values
+                    property = function(  filter + ("" if filter == "" else " AND ") + fk_filter, params + tuple(fk_params))
     
             # attach property to the instance, otherwise it is local
             setattr(self, property_name, property)
             # set the new filter
-            setattr(self, (property_name + "_filter"), filter)
+            setattr(self, (property_name + "_filter"), key)
 
         return property   
 
@@ -657,102 +964,69 @@ class Nuclide(Ndm_base):
 
     _csv_title = "z,n,nucid,elem_symbol,charge_radius,charge_radius_unc,charge_radius_limit,atomic_mass,atomic_mass_unc,atomic_mass_limit,mass_excess,mass_excess_unc,mass_excess_limit,binding_en,binding_en_unc,binding_en_limit,qbm,qbm_unc,qbm_limit,qa,qa_unc,qa_limit,qec,qec_unc,qec_limit,sn,sn_unc,sn_limit,sp,sp_unc,sp_limit,qbmn,qbmn_unc,qbmn_limit,abundance,abundance_unc,abundance_limit"
 
-    def __init__(self):
-        super().__init__()
-        self.z = None
-        self.n = None
-        self.nucid = None
-        self.elem_symbol = None
-        self.charge_radius = Quantity("charge_radius")
-        self.atomic_mass = Quantity("atomic_mass")
-        self.mass_excess = Quantity("mass_excess")
-        self.binding_en = Quantity("binding_en")
-        self.qbm = Quantity("beta_decay_en")
-        self.s2n = Quantity("s2n")
-        self.s2p = Quantity("s2p")
-        self.qa = Quantity("qa")
-        self.qbmn = Quantity("qbmn")
-        self.sn = Quantity("sn")
-        self.sp = Quantity("sp")
-        self.qec = Quantity("qec")
-        self.abundance = Quantity("abundance")
-      
-        self._levels = None
-        self._levels_filter = None
-
-        self._gammas = None
-        self._gammas_filter = None
+    _identity = ("nucid",)
 
-        self._dr_photons = None
-        self._dr_photons_filter = None
+    _levels_relation = ndlaborm.fk_relation(ndlaborm.LEVEL, "NUC", True, "LEVEL.SEQNO", "Level")
+    _gammas_relation = ndlaborm.fk_relation(ndlaborm.GAMMA, "NUC", True, "GAMMA.START_LEVEL_SEQNO , GAMMA.SEQNO", "Gamma")
+    _daughters_relation = ndlaborm.Relation("L_DECAY.DAUGHTER.ALL", ["L_DECAY.NUC_ID"], ["nucid"], entity = "Nuclide")
+    _parents_relation = ndlaborm.Relation("L_DECAY.NUC.ALL", ["L_DECAY.DAUGHTER_NUC_ID"], ["nucid"], entity = "Nuclide")
+    _decays_relation = ndlaborm.fk_relation(ndlaborm.L_DECAY, "NUC", True, "L_DECAY.LEVEL_SEQNO , L_DECAY.MODE", "L_decay")
+    _prefetch = {"levels" : (_levels_relation, "_levels", False), "gammas" : (_gammas_relation, "_gammas", False),
+                 "decays" : (_decays_relation, "_decays", False)}
 
-        self._daughters = None
-        self._parents = None
+    __slots__ = ("z", "n", "nucid", "elem_symbol", "charge_radius", "atomic_mass", "mass_excess", "binding_en", "qbm", "s2n", "s2p", "qa", "qbmn", "sn", "sp", "qec", "abundance")
+    _caches = ("_levels", "_levels_filter", "_gammas", "_gammas_filter", "_dr_photons", "_dr_photons_filter", "_daughters", "_parents", "_decays")
+    _columns = {"z" : ("z", _int_check), "n" : ("n", _int_check), "nucid" : ("nucid", None), "elem_symbol" : ("elem_symbol", None),
+                "charge_radius" : ("charge_radius", Quantity), "atomic_mass" : ("atomic_mass", Quantity),
+                "mass_excess" : ("mass_excess", Quantity), "binding_en" : ("binding_en", Quantity), "qbm" : ("beta_decay_en", Quantity),
+                "s2n" : ("s2n", Quantity), "s2p" : ("s2p", Quantity), "qa" : ("qa", Quantity), "qbmn" : ("qbmn", Quantity),
+                "sn" : ("sn", Quantity), "sp" : ("sp", Quantity), "qec" : ("qec", Quantity), "abundance" : ("abundance", Quantity)}
+    _pk_attrs = ("nucid",)
 
-        self._decays = None
 
-    def _populate(self,data):
-        self.z =  _int_check(data["z"])
-        self.n =  _int_check(data["n"])
-        self.nucid =  data["nucid"]
-        self.elem_symbol =  data["elem_symbol"]
-        self.charge_radius._populate(data)
-        self.atomic_mass._populate(data)
-        self.mass_excess._populate(data)
-        self.binding_en._populate(data)
-        self.qbm._populate(data)
-        self.s2n._populate(data)
-        self.s2p._populate(data)
-        self.qa._populate(data)
-        self.qbmn._populate(data)
-        self.sn._populate(data)
-        self.sp._populate(data)
-        self.qec._populate(data)
-        self.abundance._populate(data)# =  _float_check(data["abundance"])
-
-        self.pk = self.nucid
-
-    def levels(self, filter=DEFAULT):
+    def levels(self, filter=DEFAULT, params=()):
         """Energy levels of this nuclide
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`NUCLIDE <NUCLIDE>` entity  
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Level` of this nuclide
         """
        
-        return self._property_filler("_levels","levels", filter, "  LEVEL.NUC_ID = '" + self.nucid + "' ORDER BY LEVEL.SEQNO"  )
+        return self._property_filler("_levels","levels", filter, self._levels_relation, params = params )
     
 
-    def gammas(self, filter=DEFAULT):
+    def gammas(self, filter=DEFAULT, params=()):
         """Gamma transitions between levels of this nuclide
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`NUCLIDE <NUCLIDE>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Gamma` of this nuclide
         """
 
-        return self._property_filler("_gammas","gammas", filter, "  GAMMA.NUC_ID = '" + self.nucid + "' ORDER BY GAMMA.START_LEVEL_SEQNO , GAMMA.SEQNO" , True)
+        return self._property_filler("_gammas","gammas", filter, self._gammas_relation , True, params = params )
     
     @property
     def daughters(self):
        
         if(self._daughters == None):
-            self._daughters = this._generator("L_DECAY.DAUGHTER.ALL", "Nuclide", "L_DECAY.NUC_ID = '" + self.nucid + "' " )
+            self._daughters = self._related(self._daughters_relation)
         return self._daughters
     
     @property
     def parents(self):
 
         if(self._parents == None):
-            self._parents = this._generator("L_DECAY.NUC.ALL", "Nuclide", "L_DECAY.DAUGHTER_NUC_ID = '" + self.nucid + "' " )
+            self._parents = self._related(self._parents_relation)
         return self._parents
 
     @property
     def decays(self):
         if(self._decays == None):
-            self._decays = this._generator("L_DECAY.ALL", "L_decay", " L_DECAY.NUC_ID = '" + self.nucid + "' ORDER BY L_DECAY.LEVEL_SEQNO , L_DECAY.MODE" ) #DECAY_RAD.PARENT_NUC_ID = L_DECAY.NUC_ID and
+            self._decays = self._related(self._decays_relation)
         return self._decays
        
     @property
@@ -764,21 +1038,15 @@ class Nuclide(Ndm_base):
 
     @property
     def daughters_chain(self):
-        offs =[]    
         dau_ids = self._offsprings(self)
-        for nid in dau_ids:
-            offs.append(nuclide(nid))
-        
-        return offs
+        with (self._session or _session()):
+            return nuclides_by_id(dau_ids)
 
     @property
     def parents_chain(self):
-        pars =[]
         par_ids = self._ancestors(self)
-        for nid in par_ids:
-            pars.append(nuclide(nid))
-        
-        return pars
+        with (self._session or _session()):
+            return nuclides_by_id(par_ids)
 
 
     def _offsprings(self, nuc, offsprings = []):
@@ -845,64 +1113,30 @@ class Level(Ndm_base):
 
     _csv_title = "z,n,nucid,l_seqno,energy,energy_unc,energy_limit,half_life,half_life_unc,half_life_limit,half_life_units,half_life_sec,half_life_sec_unc,half_life_sec_limit,j,parity,jp_order,jp_method,jp_str,quadrupole_em,quadrupole_em_unc,quadrupole_em_limit,dipole_mm,dipole_mm_unc,dipole_mm_limit,questionable,configuration,isospin"
 
-    def __init__(self):
-        super().__init__()
-        self.z = None
-        self.n = None
-        self.nucid = None
-        self.l_seqno = None
-        self.energy = Quantity("energy")
-        self.half_life = Quantity("half_life")
-        self.half_life_units = None
-        self.half_life_sec = Quantity("half_life_sec")
-        self.j = None
-        self.jp_str = None
-        self.parity = None
-        self.jp_order = None
-        self.jp_method = None
-        self.quadrupole_em = Quantity("quadrupole_em")
-        self.dipole_mm = Quantity("dipole_mm")
-       
-        self.questionable = None
-        self.configuration = None
-        self.isospin = None
-       
-        self._nuclides = None
-        self._daughters = None
-        self._gammas = None
-        self._gammas_filter = None
-        self._l_decays = None
-        self._l_decays_filter = None
-       
+    _identity = ("nucid", "l_seqno")
 
+    _nuclide_relation = ndlaborm.fk_relation(ndlaborm.LEVEL, "NUC", entity = "Nuclide")
+    _gammas_relation = ndlaborm.fk_relation(ndlaborm.GAMMA, "START_LEVEL", True, "GAMMA.SEQNO", "Gamma")
+    _decays_relation = ndlaborm.fk_relation(ndlaborm.L_DECAY, "LEVEL", True, entity = "L_decay")
+    _prefetch = {"nuclide" : (_nuclide_relation, "_nuclides", False), "gammas" : (_gammas_relation, "_gammas", False),
+                 "decays" : (_decays_relation, "_l_decays", False)}
 
-    def _populate(self,data):
-        self.z =  _int_check(data["z"])
-        self.n =  _int_check(data["n"])
-        self.nucid =  data["nucid"]        
-        self.l_seqno =  _int_check(data["l_seqno"])
-        self.energy._populate(data)
-        self.half_life._populate(data)
-        self.half_life_units =  data["half_life_units"]
-        self.half_life_sec._populate(data) 
-        self.jp_str =  _str_check(data["jp_str"])
-        self.j =  _str_check(data["j"])
-        self.parity =  _int_check(data["parity"])
-        self.jp_order =  _int_check(data["jp_order"])
-        self.jp_method =  _int_check(data["jp_method"])
-        self.quadrupole_em._populate(data)
-        self.dipole_mm._populate(data)
-       
-        self.questionable =  _str_check(data["questionable"])
-        self.configuration = _str_check( data["configuration"])
-        self.isospin = _str_check( data["isospin"])
+    __slots__ = ("z", "n", "nucid", "l_seqno", "energy", "half_life", "half_life_units", "half_life_sec", "j", "jp_str", "parity", "jp_order", "jp_method", "quadrupole_em", "dipole_mm", "questionable", "configuration", "isospin")
+    _caches = ("_nuclides", "_daughters", "_gammas", "_gammas_filter", "_l_decays", "_l_decays_filter")
+    _columns = {"z" : ("z", _int_check), "n" : ("n", _int_check), "nucid" : ("nucid", None), "l_seqno" : ("l_seqno", _int_check),
+                "energy" : ("energy", Quantity), "half_life" : ("half_life", Quantity), "half_life_units" : ("half_life_units", None),
+                "half_life_sec" : ("half_life_sec", Quantity), "jp_str" : ("jp_str", _str_check), "j" : ("j", _str_check),
+                "parity" : ("parity", _int_check), "jp_order" : ("jp_order", _int_check), "jp_method" : ("jp_method", _int_check),
+                "quadrupole_em" : ("quadrupole_em", Quantity), "dipole_mm" : ("dipole_mm", Quantity),
+                "questionable" : ("questionable", _str_check), "configuration" : ("configuration", _str_check),
+                "isospin" : ("isospin", _str_check)}
+    _pk_attrs = ("nucid", "l_seqno")
 
-        self.pk = self.nucid + '-' + str(self.l_seqno)
 
     @property
     def nuclide(self):
         if(self._nuclides == None):
-            self._nuclides =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.nucid + "' ")  
+            self._nuclides =  self._related(self._nuclide_relation)
         return self._nuclides[0]
 
     @property
@@ -911,32 +1145,37 @@ class Level(Ndm_base):
             return self._daughters
 
         self._daughters = []
-        for d in self.decays():
+        decays = self.decays()
+        # the daughters of all the decays in one query
+        prefetch(decays, "daughter")
+        for d in decays:
             self._daughters.append(d.daughter)
         return  self._daughters 
 
 
-    def gammas(self, filter=DEFAULT):
+    def gammas(self, filter=DEFAULT, params=()):
         """Gamma transitions starting from this level
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`LEVEL <LEVEL>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Gamma` starting from this level
         """
 
-        return self._property_filler("_gammas","gammas", filter, " GAMMA.NUC_ID = '" + self.nucid + "' and GAMMA.START_LEVEL_SEQNO = " + str(self.l_seqno) + " ORDER BY GAMMA.SEQNO")
+        return self._property_filler("_gammas","gammas", filter, self._gammas_relation, params = params )
         
-    def decays(self, filter=DEFAULT):
+    def decays(self, filter=DEFAULT, params=()):
         """Decay modes of this level
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`NUCLIDE <NUCLIDE>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.L_decays` of this level
         """
 
-        return self._property_filler("_l_decays","l_decays", filter, " L_DECAY.NUC_ID = '" + self.nucid + "' and L_DECAY.LEVEL_SEQNO = " + str(self.l_seqno), True )
+        return self._property_filler("_l_decays","l_decays", filter, self._decays_relation, True, params = params )
 
 
 class L_decay(Ndm_base): 
@@ -961,131 +1200,102 @@ class L_decay(Ndm_base):
     """
     _csv_title = "z,n,nucid,l_seqno,code,daughter_nucid,z_dau,n_dau,perc,perc_unc,perc_limit,q_togs,q_togs_unc,q_togs_limit"
 
-    def __init__(self):
-        super().__init__()
-
-        self.nucid = None
-        self.l_seqno = None
-        self.code = None
-        self.daughter_nucid = None
-
-        self.perc = Quantity("perc")
-        self._en_recoil = Quantity("recoil_tot_en")
-        self.q_togs = Quantity("q_togs")
-        
-        self._gamma = None
-        self._gamma_filter = None
-        self._alpha = None
-        self._alpha_filter = None
-        self._annihil = None
-        self._annihil_filter = None
-        self._betam = None
-        self._betam_filter = None
-        self._anti_nu = None
-        self._anti_nu_filter = None
-        self._betap = None
-        self._betap_filter = None
-        self._annhils = None
-        self._annhils_filter = None
-        self._nu = None
-        self._nu_filter = None
-        self._x = None
-        self._x_filter = None
-        self._ce = None
-        self._ce_filter = None
-        self._auger = None
-        self._auger_filter = None
-        self._photon_tot = None 
-        self._photon_tot_filter = None
-
-        self._nuclide = None
-        self._levels = None
-        self._daughters = None
-        self._mode = None
-
-    def _populate(self,data):
-       
-        self.z =  _int_check(data["z"])
-        self.n =  _int_check(data["n"])
-        self.nucid =  data["nucid"]
-        self.l_seqno =  _int_check(data["l_seqno"])
-        self.code =  _int_check(data["decay_code"])
-        self.daughter_nucid =  data["daughter_nucid"]
-        self.z_dau =  _int_check(data["z_dau"])
-        self.n_dau =  _int_check(data["n_dau"])
-        self.perc._populate(data)
-        self._en_recoil._populate(data)
-        self.q_togs._populate(data)
-   
-        self.pk = self.nucid + '-' + str(self.l_seqno) + '-' + str(self.code)
-
-
-        self._sql_decrad =  " DECAY_RAD.PARENT_NUC_ID = '" + self.nucid + "' and DECAY_RAD.PARENT_LEVEL_SEQNO = " + str(self.l_seqno) + " and DECAY_RAD.MODE = " + str(self.code) + " ORDER BY DECAY_RAD.ENERGY"
-
-    def gammas(self, filter=DEFAULT):
+    _nuclide_relation = ndlaborm.fk_relation(ndlaborm.L_DECAY, "NUC", entity = "Nuclide")
+    _daughter_relation = ndlaborm.fk_relation(ndlaborm.L_DECAY, "DAUGHTER", entity = "Nuclide")
+    _level_relation = ndlaborm.fk_relation(ndlaborm.L_DECAY, "LEVEL", entity = "Level")
+    # the radiations of the decay, by table
+    _relations = {table : ndlaborm.Relation(table, [table + ".PARENT_NUC_ID", table + ".PARENT_LEVEL_SEQNO", table + ".MODE"],
+                                            ["nucid", "l_seqno", "decay_code"], table + (".SEQNO" if table == "DR_GAMMA" else ".ENERGY"), entity)
+                  for table, entity in (("DR_GAMMA", "Dr_gamma"), ("DR_ALPHA", "Dr_alpha"), ("DR_ANNIHIL", "Dr_annihil"), ("DR_BETAM", "Dr_betam"),
+                                        ("DR_ANTI_NU", "Dr_anti_nu"), ("DR_NU", "Dr_nu"), ("DR_BETAP", "Dr_betap"), ("DR_X", "Dr_x"),
+                                        ("DR_CONV_EL", "Dr_conv_el"), ("DR_AUGER", "Dr_auger"))}
+    _column_attrs = {"decay_code" : "code"}
+    _prefetch = {"nuclide" : (_nuclide_relation, "_nuclide", True), "daughter" : (_daughter_relation, "_daughters", False),
+                 "level" : (_level_relation, "_levels", True), "gammas" : (_relations["DR_GAMMA"], "_gamma", False), "alphas" : (_relations["DR_ALPHA"], "_alpha", False),
+                 "annihil" : (_relations["DR_ANNIHIL"], "_annhils", False), "betas_m" : (_relations["DR_BETAM"], "_betam", False),
+                 "anti_nus" : (_relations["DR_ANTI_NU"], "_anti_nu", False), "nus" : (_relations["DR_NU"], "_nu", False),
+                 "betas_p" : (_relations["DR_BETAP"], "_betap", False), "xs" : (_relations["DR_X"], "_x", False),
+                 "convels" : (_relations["DR_CONV_EL"], "_ce", False), "augers" : (_relations["DR_AUGER"], "_auger", False)}
+
+    __slots__ = ("nucid", "l_seqno", "code", "daughter_nucid", "perc", "_en_recoil", "q_togs", "z", "n", "z_dau", "n_dau")
+    _caches = ("_gamma", "_gamma_filter", "_alpha", "_alpha_filter", "_annihil", "_annihil_filter", "_betam", "_betam_filter", "_anti_nu", "_anti_nu_filter", "_betap", "_betap_filter", "_annhils", "_annhils_filter", "_nu", "_nu_filter", "_x", "_x_filter", "_ce", "_ce_filter", "_auger", "_auger_filter", "_photon_tot", "_photon_tot_filter", "_nuclide", "_levels", "_daughters", "_mode")
+    _columns = {"z" : ("z", _int_check), "n" : ("n", _int_check), "nucid" : ("nucid", None), "l_seqno" : ("l_seqno", _int_check),
+                "code" : ("decay_code", _int_check), "daughter_nucid" : ("daughter_nucid", None), "z_dau" : ("z_dau", _int_check),
+                "n_dau" : ("n_dau", _int_check), "perc" : ("perc", Quantity), "_en_recoil" : ("recoil_tot_en", Quantity),
+                "q_togs" : ("q_togs", Quantity)}
+    _pk_attrs = ("nucid", "l_seqno", "code")
+
+
+    def gammas(self, filter=DEFAULT, params=()):
         """Gamma radiation from this decay
 
         The radiation is emitted by the daughter
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_gamma` from this decay
         """
 
-        return self._property_filler("_gamma","dr_gammas", filter, " DR_GAMMA.PARENT_NUC_ID = '" + self.nucid + "' and DR_GAMMA.PARENT_LEVEL_SEQNO = " + str(self.l_seqno) + " and DR_GAMMA.MODE = " + str(self.code) + " ORDER BY DR_GAMMA.SEQNO") 
+        return self._property_filler("_gamma","dr_gammas", filter, self._relations["DR_GAMMA"], params = params )
 
-    def alphas(self, filter=DEFAULT):
+    def alphas(self, filter=DEFAULT, params=()):
         """Alpha radiation from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_ALPHA <DR_ALPHA>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_alpha` from this decay
         """
-        return self._property_filler("_alpha","dr_alphas", filter, self._sql_decrad )
+        return self._property_filler("_alpha","dr_alphas", filter, self._relations["DR_ALPHA"], params = params )
     
-    def annihil(self, filter=DEFAULT):
+    def annihil(self, filter=DEFAULT, params=()):
         """Annihilation radiation
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_ANNIHIL <DR_ANNIHIL>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_annihil` from this decay
         """
-        return self._property_filler("_annihil","dr_annihil", filter, self._sql_decrad )
+        return self._property_filler("_annihil","dr_annihil", filter, self._relations["DR_ANNIHIL"], params = params )
 
-    def betas_m(self, filter=DEFAULT):
+    def betas_m(self, filter=DEFAULT, params=()):
         """Beta- radiation from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_BETAM <DR_BETAM>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_betam` from this decay
         """
         
-        return self._property_filler("_betam","dr_beta_ms", filter, self._sql_decrad )
+        return self._property_filler("_betam","dr_beta_ms", filter, self._relations["DR_BETAM"], params = params )
 
-    def anti_nus(self, filter=DEFAULT):
+    def anti_nus(self, filter=DEFAULT, params=()):
         """Anti neutrino radiation from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_ANTI_NU <DR_ANTI_NU>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_anti_nu` from this decay
         """
         
-        return self._property_filler("_anti_nu","dr_anti_nus", filter, self._sql_decrad )
+        return self._property_filler("_anti_nu","dr_anti_nus", filter, self._relations["DR_ANTI_NU"], params = params )
 
-    def nus(self, filter=DEFAULT):
+    def nus(self, filter=DEFAULT, params=()):
         """Neutrino radiation from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_NU <DR_NU>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_Nu` from this decay
         """
-        dm = self._property_filler("_nu","dr_nus", filter, self._sql_decrad )   
+        dm = self._property_filler("_nu","dr_nus", filter, self._relations["DR_NU"], params = params )   
         #ddm = copy.deepcopy(dm) 
         #for d in dm:
         #    dd = copy.deepcopy(d)
@@ -1096,43 +1306,46 @@ class L_decay(Ndm_base):
         self._nu = dm
         return self._nu
 
-    def betas_p(self, filter=DEFAULT):
+    def betas_p(self, filter=DEFAULT, params=()):
         """Beta+ radiation from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_BETAP <DR_BETAP>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_betap` from this decay
         """
-        return self._property_filler("_betap","dr_beta_ps", filter, self._sql_decrad )  
+        return self._property_filler("_betap","dr_beta_ps", filter, self._relations["DR_BETAP"], params = params )  
 
-    def annihil(self, filter=DEFAULT):
+    def annihil(self, filter=DEFAULT, params=()):
         """Annihilation radiation from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_ANNIHIL <DR_ANNIHIL>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_annihil` from this decay
         """
         
-        return self._property_filler("_annhils","dr_annihil", filter, self._sql_decrad ) 
+        return self._property_filler("_annhils","dr_annihil", filter, self._relations["DR_ANNIHIL"], params = params ) 
 
-    def dr_photon_tot(self, filter=DEFAULT):
+    def dr_photon_tot(self, filter=DEFAULT, params=()):
         """Photons emitted in the decay process, if any, regardless of the daughter or the radiation type (X- or Gamma- ray)
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_PHOTON_TOTAL <DR_PHOTON_TOTAL>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_photon_tot` from this decay
 
         """
         
-        return self._property_filler("_photon_tot","dr_photon_tot", filter, "  DR_PHOTON_TOTAL.PARENT_NUC_ID = '" + self.nucid + "' and DR_PHOTON_TOTAL.PARENT_LEVEL.SEQNO = " + str(self.l_seqno) + " ORDER BY DR_PHOTON_TOTAL.ENERGY" , True ) 
+        return self._property_filler("_photon_tot","dr_photon_tot", filter, "  DR_PHOTON_TOTAL.PARENT_NUC_ID = ? and DR_PHOTON_TOTAL.PARENT_LEVEL.SEQNO = ? ORDER BY DR_PHOTON_TOTAL.ENERGY" , True, params = params, fk_params = (self.nucid, self.l_seqno) )
 
     @property
     def nuclide(self):
          if(self._nuclide == None):
-             self._nuclide = this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.nucid + "' " )
+             self._nuclide = self._related(self._nuclide_relation)
              if(self._nuclide != None and len(self._nuclide) > 0):
                 self._nuclide = self._nuclide[0]
          return self._nuclide  
@@ -1140,19 +1353,20 @@ class L_decay(Ndm_base):
     @property
     def level(self):
          if(self._levels == None):
-             self._levels = this._generator("LEVEL", "Levels",  " LEVEL.NUC_ID = '" + self.nucid + "' and LEVEL.SEQNO = " + self.l_seqno)
+             self._levels = self._related(self._level_relation)
+             if(self._levels != None): self._levels = self._levels[0]
          return self._levels  
 
     @property
     def daughter(self):
          if(self._daughters == None):
-             self._daughters = this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.daughter_nucid + "' ")
+             self._daughters = self._related(self._daughter_relation)
          return self._daughters[0]  
 
     @property
     def mode(self):
          if(self._mode == None):
-            self._mode =  this._generator("DECAY_MODE","Decay_mode" ," DECAY_MODE.CODE = '" + str(self.code) + "' ")
+            self._mode =  self._generator("DECAY_MODE","Decay_mode" ," DECAY_MODE.CODE = ? ", (self.code,) )
          return self._mode[0]
 
     @property
@@ -1160,38 +1374,41 @@ class L_decay(Ndm_base):
         return self._en_recoil
 
 
-    def xs(self, filter=DEFAULT):
+    def xs(self, filter=DEFAULT, params=()):
         """X-rays radiation from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_X <DR_X>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_x` from this decay
         """
 
-        return self._property_filler("_x","dr_xs", filter, self._sql_decrad )  
+        return self._property_filler("_x","dr_xs", filter, self._relations["DR_X"], params = params )  
 
-    def convels(self, filter=DEFAULT):
+    def convels(self, filter=DEFAULT, params=()):
         """Conversion electrons from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_CONV_EL <DR_CONV_EL>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.dr_conv_el` from this decay
         """
 
-        return self._property_filler("_ce","dr_convels", filter, self._sql_decrad )  
+        return self._property_filler("_ce","dr_convels", filter, self._relations["DR_CONV_EL"], params = params )  
         
-    def augers(self, filter=DEFAULT):
+    def augers(self, filter=DEFAULT, params=()):
         """Auger electrons from this decay
 
         Args:
             filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_AUGER <DR_AUGER>` entity
+            params (tuple): the values of the ? placeholders in the filter
         Returns: 
            the  list of :py:class:`ndlab.Dr_auger` from this decay
         """
 
-        return self._property_filler("_auger","dr_augers", filter, self._sql_decrad )          
+        return self._property_filler("_auger","dr_augers", filter, self._relations["DR_AUGER"], params = params )          
 
     def tot_rad_en(self, radiations):
         """ Energy emitted by a set of radiations
@@ -1211,7 +1428,8 @@ class L_decay(Ndm_base):
     def tot_measured_en(self):
         """ Total energy emitted per 100 decays of the parent
 
-        calculated as sum (energy * intensity / 100 )  over all radiations
+        calculated as sum (energy * intensity / 100 )  over all radiations.
+        For many decays, :py:func:`ndlab.prefetch` their radiations first, e.g. :code:`prefetch(decays, *RADIATIONS)`
 
         Returns:
             Quantity: the total energy
@@ -1251,74 +1469,47 @@ class Gamma(Ndm_base):
 
     """
     _csv_title = 'z,n,nucid,g_seqno,l_seqno,energy,energy_unc,energy_limit,rel_photon_intens,rel_photon_intens_unc,rel_photon_intens_limit,multipolarity,mixing_ratio,mixing_ratio_unc,mixing_ratio_limit,tot_conv_coeff,tot_conv_coeff_unc,tot_conv_coeff_limit,bew,bew_unc,bew_limit,bew_order,bmw,bmw_unc,bmw_limit,bmw_order,questionable,final_l_seqno'
-    
-    def __init__(self):
-        super().__init__()
-        self.z = None
-        self.n = None
-        self.nucid = None
-        self.g_seqno = None
-        self.l_seqno = None
-        self.energy = Quantity("energy")
-        self.rel_photon_intens = Quantity("rel_photon_intens")
-        self.multipolarity = None
-        self.mixing_ratio = Quantity("mixing_ratio")
-        self.tot_conv_coeff = Quantity("tot_conv_coeff")
-        self.bew = Quantity("bew") 
-        self.bew_order = None
-        self.bmw = Quantity("bmw")
-        self.bmw_order = None
-        self.questionable = None
-        self.final_l_seqno = None
-
-        self._nuclides = None
-        self._start_level = None
-        self._end_level = None
+
+    _identity = ("nucid", "l_seqno", "g_seqno")
+
+    _nuclide_relation = ndlaborm.fk_relation(ndlaborm.GAMMA, "NUC", entity = "Nuclide")
+    _start_level_relation = ndlaborm.fk_relation(ndlaborm.GAMMA, "START_LEVEL", entity = "Level")
+    _end_level_relation = ndlaborm.fk_relation(ndlaborm.GAMMA, "END_LEVEL", entity = "Level")
+    _prefetch = {"nuclide" : (_nuclide_relation, "_nuclides", False), "start_level" : (_start_level_relation, "_start_level", False),
+                 "end_level" : (_end_level_relation, "_end_level", True)}
+
+    __slots__ = ("z", "n", "nucid", "g_seqno", "l_seqno", "energy", "rel_photon_intens", "multipolarity", "mixing_ratio", "tot_conv_coeff", "bew", "bew_order", "bmw", "bmw_order", "questionable", "final_l_seqno")
+    _caches = ("_nuclides", "_start_level", "_end_level")
+    _columns = {"z" : ("z", _int_check), "n" : ("n", _int_check), "nucid" : ("nucid", None), "g_seqno" : ("g_seqno", _int_check),
+                "l_seqno" : ("l_seqno", _int_check), "energy" : ("energy", Quantity),
+                "rel_photon_intens" : ("rel_photon_intens", Quantity), "multipolarity" : ("multipolarity", _str_check),
+                "mixing_ratio" : ("mixing_ratio", Quantity), "tot_conv_coeff" : ("tot_conv_coeff", Quantity), "bew" : ("bew", Quantity),
+                "bew_order" : ("bew_order", _int_check), "bmw" : ("bmw", Quantity), "bmw_order" : ("bmw_order", _int_check),
+                "questionable" : ("questionable", _str_check), "final_l_seqno" : ("final_l_seqno", _int_check)}
+    _pk_attrs = ("nucid", "l_seqno", "g_seqno")
+
 
     @property
     def nuclide(self):
         if(self._nuclides == None):
-            self._nuclides =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.nucid + "' ")  
+            self._nuclides =  self._related(self._nuclide_relation)
         return self._nuclides[0]
 
     @property
     def start_level(self):
          if(self._start_level == None):
-             self._start_level = this._generator("LEVEL", "Level",  " LEVEL.NUC_ID = '" + self.nucid + "' and LEVEL.SEQNO = " + str(self.l_seqno))
+             self._start_level = self._related(self._start_level_relation)
          return self._start_level  
 
     @property
     def end_level(self):
             if(self._end_level == None):
-                self._end_level = this._generator("LEVEL", "Level",  " LEVEL.NUC_ID = '" + self.nucid + "' and LEVEL.SEQNO = " + str(self.final_l_seqno))
+                self._end_level = self._related(self._end_level_relation)
                 if(self._end_level != None): self._end_level = self._end_level[0]
 
             return self._end_level
 
 
-    def _populate(self,data):
-        self.z =  _int_check(data["z"])
-        self.n =  _int_check(data["n"])
-        self.nucid =  data["nucid"]
-        self.g_seqno =  _int_check(data["g_seqno"])
-        self.l_seqno =  _int_check(data["l_seqno"])
-        self.energy._populate(data)
-        self.rel_photon_intens._populate(data)
-        self.multipolarity =  _str_check(data["multipolarity"])
-        self.mixing_ratio._populate(data)
-        self.tot_conv_coeff._populate(data)
-        self.bew._populate(data)
-        self.bew_order =  _int_check(data["bew_order"])
-        self.bmw._populate(data)
-        self.bmw_order =  _int_check(data["bmw_order"])
-        self.questionable =  _str_check(data["questionable"])
-        self.final_l_seqno = _int_check(data["final_l_seqno"])
-
-        self.pk = self.nucid + '-' + str(self.l_seqno) + '-' + str(self.g_seqno)
-
-
-
-
 class Decay_radiation(Ndm_base):
     """Base class for decay radiations
 
@@ -1341,113 +1532,71 @@ class Decay_radiation(Ndm_base):
     :ivar int decay_code: code of the decay, see the DECAY_* constants in ndlaborm
 
 
-   
     """
 
     _csv_title = 'parent_nucid,parent_l_seqno,parent_z,parent_n,daughter_nucid,daughter_z,daughter_n,daughter_l_seqno,adopted_daughter_g_seqno,decay_code,type_a,type_b,type_c,ec_energy,ec_energy_unc,ec_energy_limit,bpec_intensity,bpec_intensity_unc,bpec_intensity_limit,ec_intensity,ec_intensity_unc,ec_intensity_limit,b_logft,b_logft_unc,b_logft_limit,intensity,intensity_unc,intensity_limit,b_trans_type,energy,energy_unc,energy_limit,a_hindrance,a_hindrance_unc,a_hindrance_limit,b_endpoint,b_endpoint_unc,b_endpoint_limit,d_energy_x,d_energy_x_unc,d_energy_x_limit,r_seqno,energy_nu,energy_nu_unc,energy_nu_limit'
     _csv_title_short = 'parent_nucid,parent_l_seqno,parent_z,parent_n,daughter_nucid,daughter_z,daughter_n,daughter_l_seqno,energy,energy_unc,energy_limit,intensity,intensity_unc,intensity_limit'
+
+    _parent_relation = ndlaborm.fk_relation(ndlaborm.DECAY_RAD, "PARENT", entity = "Nuclide")
+    _daughter_relation = ndlaborm.fk_relation(ndlaborm.DECAY_RAD, "DAUGHTER", entity = "Nuclide")
+    _fed_level_relation = ndlaborm.fk_relation(ndlaborm.DECAY_RAD, "DAUGHTER_FED_LEVEL", entity = "Level")
+    _parent_level_relation = ndlaborm.fk_relation(ndlaborm.DECAY_RAD, "PARENT_LEVEL", entity = "Level")
+    _decay_relation = ndlaborm.Relation("L_DECAY", ["L_DECAY.NUC_ID", "L_DECAY.LEVEL_SEQNO", "L_DECAY.MODE"],
+                                        ["parent_nucid", "parent_l_seqno", "decay_code"], entity = "L_decay")
+    _column_attrs = {"adopted_daughter_l_seqno" : "daughter_l_seqno"}
+    _prefetch = {"parent" : (_parent_relation, "_parent", False), "daughter" : (_daughter_relation, "_daughter", False),
+                 "fed_level" : (_fed_level_relation, "_fed_level", False), "parent_level" : (_parent_level_relation, "_parent_level", False),
+                 "decay" : (_decay_relation, "_decay", False)}
   
 #    adopted_daughter_g_seqno,decay_code,type_a,type_b,type_c,ec_energy,ec_energy_unc,ec_energy_limit,bpec_intensity,bpec_intensity_unc,bpec_intensity_limit,ec_intensity,ec_intensity_unc,ec_intensity_limit,b_logft,b_logft_unc,b_logft_limit,intensity,intensity_unc,intensity_limit,b_trans_type,energy,energy_unc,energy_limit,a_hindrance,a_hindrance_unc,a_hindrance_limit,b_endpoint,b_endpoint_unc,b_endpoint_limit,d_energy_x,d_energy_x_unc,d_energy_x_limit,r_seqno,energy_nu,energy_nu_unc,energy_nu_limit'
 
-    def __init__(self):
-        super().__init__()
-        self.parent_nucid = None
-        self.parent_l_seqno = None
-        self.daughter_nucid = None
-        self.daughter_l_seqno = None
-
-        self.decay_code = None
-        self.type_a = None
-        self.type_b = None
-        self.type_c = None
-
-        self.intensity = Quantity("intensity")
-        self.energy = Quantity("energy")
-
-        self.r_seqno = None
-
-        self._parent = None
-        self._daughter = None
-        self._fed_level = None
-        self._start_level = None
-        self._decay = None
-
-
-    def _populate(self,data):
-        self.parent_nucid =  data["parent_nucid"]
-        self.parent_l_seqno =  _int_check(data["parent_l_seqno"])
-        self.parent_z =  _int_check(data["z"])
-        self.parent_n =  _int_check(data["n"])
-
-        self.daughter_nucid =  data["daughter_nucid"]
-        self.daughter_l_seqno =  _int_check(data["adopted_daughter_l_seqno"])
-        self.daughter_z = _int_check(data["z_dau"])
-        self.daughter_n = _int_check( data["n_dau"])
-
-
-        self.decay_code =  _int_check(data["decay_code"])
-        self.type_a =  data["type_a"]
-        self.type_b =  data["type_b"]
-        self.type_c =  data["type_c"]
-        self.intensity._populate(data)
-        self.energy._populate(data)
-        self.r_seqno =  _int_check(data["r_seqno"])
-
-        self.pk = str(self.r_seqno)
+    __slots__ = ("parent_nucid", "parent_l_seqno", "daughter_nucid", "daughter_l_seqno", "decay_code", "type_a", "type_b", "type_c", "intensity", "energy", "r_seqno", "parent_z", "parent_n", "daughter_z", "daughter_n")
+    _caches = ("_parent", "_daughter", "_fed_level", "_parent_level", "_start_level", "_decay")
+    _columns = {"parent_nucid" : ("parent_nucid", None), "parent_l_seqno" : ("parent_l_seqno", _int_check), "parent_z" : ("z", _int_check),
+                "parent_n" : ("n", _int_check), "daughter_nucid" : ("daughter_nucid", None),
+                "daughter_l_seqno" : ("adopted_daughter_l_seqno", _int_check), "daughter_z" : ("z_dau", _int_check),
+                "daughter_n" : ("n_dau", _int_check), "decay_code" : ("decay_code", _int_check), "type_a" : ("type_a", None),
+                "type_b" : ("type_b", None), "type_c" : ("type_c", None), "intensity" : ("intensity", Quantity),
+                "energy" : ("energy", Quantity), "r_seqno" : ("r_seqno", _int_check)}
+    _pk_attrs = ("r_seqno",)
 
 
     @property
     def parent(self):
         if(self._parent == None):
-                self._parent =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.parent_nucid + "' ")  
+                self._parent =  self._related(self._parent_relation)
         return self._parent[0]
 
     @property
     def daughter(self):
         if(self._daughter == None):
-                self._daughter =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.daughter_nucid + "' ")  
+                self._daughter =  self._related(self._daughter_relation)
         return self._daughter[0]
 
     @property
     def fed_level(self):
         if(self._fed_level == None):
-            self._fed_level = this._generator("LEVEL", "Level",   " LEVEL.NUC = '" + self.daughter_nucid + "' and LEVEL.SEQNO = " + str(self.daughter_l_seqno)  + " ")
-        return self._fed_level[0]  
+            self._fed_level = self._related(self._fed_level_relation)
+        return self._fed_level[0]
 
     @property
     def parent_level(self):
         if(self._parent_level == None):
-            self._parent_level = this._generator("LEVEL", "Level",   " LEVEL.NUC = '" + self.parent_nucid + "' and LEVEL.SEQNO = " + str(self.parent_l_seqno)  + " ")
-        return self._parent_level[0]  
+            self._parent_level = self._related(self._parent_level_relation)
+        return self._parent_level[0]
 
     @property
     def decay(self):
         if(self._decay == None):
-            self._decay = this._generator("L_DECAY","L_decay", " L_DECAY.NUC = '" + self.parent_nucid + "' and L_DECAY.LEVEL = " + str(self.parent_l_seqno)  + " and L_DECAY.CODE = " +str(self.decay_code) + " ")
+            self._decay = self._related(self._decay_relation)
         return self._decay[0]
 
 
 class Decay_mode(Ndm_base):
-  
-    def __init__(self):
-        super().__init__()
-        self.name = None
-        self.code = None
-        self.desc = None
-
-        #self.ensdf_code = None
-        #self.decay_code = None
-        #self.dataset_code = None
-
-
-    def _populate(self,data):
-        self.name =  data["mode"]
-        self.code =  _int_check(data["code"])
-        self.desc =  data["desc"]
-
-        self.pk = str(self.code)
-
 
+    __slots__ = ("name", "code", "desc", "ensdf_code", "decay_code", "dataset_code")
+    _columns = {"name" : ("mode", None), "code" : ("code", _int_check), "desc" : ("desc", None)}
+    _pk_attrs = ("code",)
 
 
 class _Fy(Ndm_base):
@@ -1463,39 +1612,26 @@ class _Fy(Ndm_base):
     """
     _csv_title = "parent_nucid,daughter_nucid,l_seqno,thermal,thermal_unc,thermal_limit,fast,fast_unc,fast_limit,mev_14,mev_14_unc,mev_14_limit"
 
-    def __init__(self):
-        super().__init__()
-        self.parent_nucid = None
-        self.daughter_nucid = None
-        self.l_seqno = None
-
-        self.thermal = Quantity('ther_yield')
-        self.fast = Quantity('fast_yield')
-        self.mev_14 = Quantity('mev_14_yield')
+    _parent_relation = ndlaborm.Relation("NUCLIDE", ["NUCLIDE.NUC_ID"], ["parent_nucid"], entity = "Nuclide")
+    _daughter_relation = ndlaborm.Relation("NUCLIDE", ["NUCLIDE.NUC_ID"], ["daughter_nucid"], entity = "Nuclide")
+    _prefetch = {"parent" : (_parent_relation, "_parent", False), "daughter" : (_daughter_relation, "_daughter", False)}
 
-        self._parent = None
-        self._daughter = None
+    __slots__ = ("parent_nucid", "daughter_nucid", "l_seqno", "thermal", "fast", "mev_14")
+    _caches = ("_parent", "_daughter")
+    _columns = {"parent_nucid" : ("parent_nucid", None), "daughter_nucid" : ("daughter_nucid", None), "l_seqno" : ("l_seqno", _int_check),
+                "thermal" : ("ther_yield", Quantity), "fast" : ("fast_yield", Quantity), "mev_14" : ("mev_14_yield", Quantity)}
+    _pk_attrs = ("parent_nucid", "daughter_nucid", "l_seqno")
 
 
-    def _populate(self,data):
-        self.parent_nucid =  data["parent_nucid"]
-        self.daughter_nucid =  data["daughter_nucid"]
-        self.l_seqno =  _int_check(data["l_seqno"])
-        self.thermal._populate(data)
-        self.fast._populate(data)
-        self.mev_14._populate(data)
-
-        self.pk = self.parent_nucid + '-' + self.daughter_nucid + '-' + str(self.l_seqno)
-    
     @property
     def parent(self):
         if(self._parent == None):
-                self._parent =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.parent_nucid + "' ")  
+                self._parent =  self._related(self._parent_relation)
         return self._parent[0]
     @property
     def daughter(self):
         if(self._daughter == None):
-                self._daughter =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.daughter_nucid + "' ")  
+                self._daughter =  self._related(self._daughter_relation)
         return self._daughter[0]
 
 class Cum_fy(_Fy):
@@ -1507,12 +1643,8 @@ class Cum_fy(_Fy):
     :ivar Quantity fast: fast neutron fission yield
     :ivar Quantity mev_14: 14 MeV neutron fission yield
     """
-    
-    def __init__(self):
-        super().__init__()
-    
-    def _populate(self,data):
-        super()._populate(data)
+
+    __slots__ = ()
 
 
 class Ind_fy(_Fy):
@@ -1525,13 +1657,7 @@ class Ind_fy(_Fy):
     :ivar Quantity mev_14: 14 MeV neutron fission yield
     """
 
-    
-    def __init__(self):
-        super().__init__()
-    
-    def _populate(self,data):
-        super()._populate(data)
-
+    __slots__ = ()
 
 
 class Dr_alpha(Decay_radiation):
@@ -1543,15 +1669,8 @@ class Dr_alpha(Decay_radiation):
 
     """
     _csv_title = Decay_radiation._csv_title_short + ",hindrance,hindrance_unc,hindrance_limit"
-    def __init__(self):
-        super().__init__()
-
-        self.hindrance = Quantity("a_hindrance")
-       
-
-    def _populate(self,data):
-        super()._populate(data)
-        self.hindrance._populate(data)
+    __slots__ = ("hindrance",)
+    _columns = {"hindrance" : ("a_hindrance", Quantity)}
 
 
 class Dr_betam(Decay_radiation):
@@ -1568,22 +1687,10 @@ class Dr_betam(Decay_radiation):
     """
     _csv_title = Decay_radiation._csv_title_short +   ',logft,logft_unc,logft_limit,trans_type,endpoint,endpoint_unc,endpoint_limit,anti_nu_energy,anti_nu_energy_unc,anti_nu_energy_limit'
 
+    __slots__ = ("logft", "trans_type", "endpoint", "anti_nu_energy")
+    _columns = {"logft" : ("logft", Quantity), "trans_type" : ("b_trans_type", _str_check), "endpoint" : ("b_endpoint", Quantity),
+                "anti_nu_energy" : ("energy_nu", Quantity)}
 
-    def __init__(self):
-        super().__init__()
-
-        self.logft = Quantity("logft")  
-        self.trans_type = None
-        self.endpoint = Quantity("b_endpoint")
-        self.anti_nu_energy = Quantity("energy_nu")
-      
-
-    def _populate(self,data):
-        super()._populate(data)
-        self.logft._populate(data)
-        self.trans_type =  _str_check(data["b_trans_type"])
-        self.endpoint._populate(data)
-        self.anti_nu_energy._populate(data)
 
 class Dr_anti_nu(Decay_radiation):
     """Anti neutrino  decay radiation
@@ -1596,22 +1703,9 @@ class Dr_anti_nu(Decay_radiation):
 
     _csv_title = Decay_radiation._csv_title_short +   ',logft,logft_unc,logft_limit,trans_type,endpoint,endpoint_unc,endpoint_limit,bm_energy,bm_energy_unc,bm_energy_limit'
 
-
-    def __init__(self):
-        super().__init__()
-        self.energy.name = "energy_nu"
-
-        self.logft = Quantity("logft")  
-        self.trans_type = None
-        self.endpoint = Quantity("b_endpoint")
-        self.bm_energy = Quantity("energy")
-
-    def _populate(self,data):
-        super()._populate(data)
-        self.logft._populate(data)
-        self.trans_type =  _str_check(data["b_trans_type"])
-        self.endpoint._populate(data)
-        self.bm_energy._populate(data)
+    __slots__ = ("logft", "trans_type", "endpoint", "bm_energy")
+    _columns = {"logft" : ("logft", Quantity), "trans_type" : ("b_trans_type", _str_check), "endpoint" : ("b_endpoint", Quantity),
+                "bm_energy" : ("energy", Quantity), "energy" : ("energy_nu", Quantity)}
 
 
 class Dr_nu(Decay_radiation):
@@ -1634,29 +1728,12 @@ class Dr_nu(Decay_radiation):
     """
     _csv_title = Decay_radiation._csv_title_short +   ',logft,logft_unc,logft_limit,trans_type,endpoint,endpoint_unc,endpoint_limit,bp_energy,bp_energy_unc,bp_energy_limit,energy_ec,energy_ec_unc,energy_ec_limit,intensity_ec,intensity_ec_unc,intensity_ec_limit'
 
-    def __init__(self):
-        super().__init__()
-        self.energy.name = "energy_nu"
-
-        self.intensity_ec = Quantity("intensity_ec")
-        self.energy_ec = Quantity("energy_nu_ec")
-
-        self.logft = Quantity("logft")  
-        self.trans_type = None
-        self.endpoint = Quantity("b_endpoint")
-        self.bp_energy = Quantity("energy")
+    __slots__ = ("intensity_ec", "energy_ec", "logft", "trans_type", "endpoint", "bp_energy")
+    _columns = {"intensity_ec" : ("intensity_ec", Quantity), "energy_ec" : ("energy_nu_ec", Quantity), "logft" : ("logft", Quantity),
+                "trans_type" : ("b_trans_type", _str_check), "endpoint" : ("b_endpoint", Quantity), "bp_energy" : ("energy", Quantity),
+                "energy" : ("energy_nu", Quantity)}
 
 
-    def _populate(self,data):
-        super()._populate(data)
-        self.intensity_ec._populate(data)
-        self.energy_ec._populate(data)
-
-        self.logft._populate(data)
-        self.trans_type =  _str_check(data["b_trans_type"])
-        self.endpoint._populate(data)
-        self.bp_energy._populate(data)
-       
 class Dr_betap(Dr_betam):
     """Beta+/Electron Capture decay radiation
 
@@ -1671,20 +1748,9 @@ class Dr_betap(Dr_betam):
     """
     _csv_title = Decay_radiation._csv_title_short +   ',logft,logft_unc,logft_limit,trans_type,endpoint,endpoint_unc,endpoint_limit,nu_energy,nu_energy_unc,nu_energy_limit,ec_energy,ec_energy_unc,ec_energy_limit,bpec_intensity,bpec_intensity_unc,bpec_intensity_limit,ec_intensity,ec_intensity_unc,ec_intensity_limit'
 
-    def __init__(self):
-        super().__init__()
-
-        self.ec_energy = Quantity("ec_energy")
-        self.bpec_intensity = Quantity("bpec_intensity")
-        self.ec_intensity = Quantity("ec_intensity")
-        self.nu_energy = Quantity("energy_nu")
-
-    def _populate(self,data):
-        super()._populate(data)
-        self.ec_energy._populate(data)
-        self.bpec_intensity._populate(data)
-        self.ec_intensity._populate(data)
-        self.nu_energy._populate(data)
+    __slots__ = ("ec_energy", "bpec_intensity", "ec_intensity", "nu_energy")
+    _columns = {"ec_energy" : ("ec_energy", Quantity), "bpec_intensity" : ("bpec_intensity", Quantity),
+                "ec_intensity" : ("ec_intensity", Quantity), "nu_energy" : ("energy_nu", Quantity)}
 
 
 class Dr_delayed(Decay_radiation):
@@ -1699,18 +1765,8 @@ class Dr_delayed(Decay_radiation):
 
     _csv_title = Decay_radiation._csv_title_short +  ",particle,energy_x,energy_x_unc,energy_x_limit"
 
-
-    def __init__(self):
-        super().__init__()
-
-        self.energy_x = Quantity("energy_x")
-        self.particle = None
-
-
-    def _populate(self,data):
-        super()._populate(data)
-        self.energy_x._populate(data)
-        self.particle = self.type_a
+    __slots__ = ("energy_x", "particle")
+    _columns = {"energy_x" : ("energy_x", Quantity), "particle" : ("type_a", None)}
 
 
 class Dr_gamma(Gamma):
@@ -1731,46 +1787,39 @@ class Dr_gamma(Gamma):
     """
 
     _csv_title = 'parent_z,parent_n,parent_nucid,parent_l_seqno,decay_code,z,n,nucid,g_seqno,l_seqno,final_l_seqno,energy,energy_unc,energy_limit,,intensity,intensity_limit,intensity_unc,rel_photon_intens,rel_photon_intens_unc,rel_photon_intens_limit,multipolarity,mixing_ratio,mixing_ratio_unc,mixing_ratio_limit,tot_conv_coeff,tot_conv_coeff_unc,tot_conv_coeff_limit,bew,bew_unc,bew_limit,bew_order,bmw,bmw_unc,bmw_limit,bmw_order,questionable'
-  
-    def __init__(self):
-        super().__init__()
-       
-        self.decay_code = None
-        self.intensity = Quantity("intensity")
-
-        self.parent_z =  None
-        self.parent_n = None
-        self._parent = None
-        self._parent_level = None
-        self._decay = None
+    # the same gamma is emitted in the decay of several parents
+    _identity = None
 
+    _parent_relation = ndlaborm.fk_relation(ndlaborm.DR_GAMMA, "PARENT", entity = "Nuclide")
+    _parent_level_relation = ndlaborm.fk_relation(ndlaborm.DR_GAMMA, "PARENT_LEVEL", entity = "Level")
+    # the same keys as those of the other radiations
+    _decay_relation = Decay_radiation._decay_relation
+    _prefetch = dict(Gamma._prefetch, parent = (_parent_relation, "_parent", False), parent_level = (_parent_level_relation, "_parent_level", False),
+                     decay = (_decay_relation, "_decay", False))
 
-    def _populate(self,data):
-        super()._populate(data)
-        self.parent_z =  _int_check(data["parent_z"])
-        self.parent_n =  _int_check(data["parent_n"])
-        self.parent_nucid =  data["parent_nucid"]
-        self.parent_l_seqno =  _int_check(data["parent_l_seqno"])
-        self.decay_code =  _int_check(data["decay_code"])
-        self.intensity._populate(data)
+    __slots__ = ("decay_code", "intensity", "parent_z", "parent_n", "parent_nucid", "parent_l_seqno")
+    _caches = ("_parent", "_parent_level", "_decay")
+    _columns = {"parent_z" : ("parent_z", _int_check), "parent_n" : ("parent_n", _int_check), "parent_nucid" : ("parent_nucid", None),
+                "parent_l_seqno" : ("parent_l_seqno", _int_check), "decay_code" : ("decay_code", _int_check),
+                "intensity" : ("intensity", Quantity)}
 
 
     @property
     def parent(self):
         if(self._parent == None):
-                self._parent =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.nucid + "' ")  
+                self._parent =  self._related(self._parent_relation)
         return self._parent[0]
 
     @property
     def parent_level(self):
         if(self._parent_level == None):
-            self._parent_level =  this._generator("LEVEL", "Levels", " LEVEL.NUC = '" + self.parent_nucid + "' and LEVEL.SEQNO = " + str(self.parent_l_seqno)  + " ", "levels")
+            self._parent_level =  self._related(self._parent_level_relation)
         return self._parent_level[0]
 
     @property
     def decay(self):
         if(self._decay == None):
-            self._decay = this._generator("L_DECAY","L_decays", " L_DECAY.NUC_ID = '" + self.parent_nucid + "' and L_DECAY.LEVEL_SEQNO = " + str(self.parent_l_seqno)  + " and L_DECAY.CODE = " +str(self.decay_code) + " ")
+            self._decay = self._related(self._decay_relation)
         return self._decay[0]
 
 class Dr_photon_tot(Ndm_base):
@@ -1789,52 +1838,34 @@ class Dr_photon_tot(Ndm_base):
     """
 
     _csv_title = "parent_nucid,parent_l_seqno,energy,energy_unc,energy_limit,intensity,intensity_unc,intensity_limit,type,count"
-   
-    def __init__(self):
-        self.parent_nucid = None
-        self.parent_l_seqno = None
-        self.energy = Quantity("energy")
-        self.intensity = Quantity("intensity");
-       
-        self.count = 0
-        self.type = None
 
-        self._parent = None
-        self._parent_level = None
-       
-    def _populate(self,data):
-        self.parent_nucid =  data["parent_nucid"]
-        self.parent_l_seqno = data["parent_l_seqno"]
-        self.energy._populate(data)
-        self.intensity._populate(data)
-        
-        self.type = data["type"]
-        self.count = data["cnt"]
+    __slots__ = ("parent_nucid", "parent_l_seqno", "energy", "intensity", "count", "type")
+    _caches = ("_parent", "_parent_level")
+    _columns = {"parent_nucid" : ("parent_nucid", None), "parent_l_seqno" : ("parent_l_seqno", None), "energy" : ("energy", Quantity),
+                "intensity" : ("intensity", Quantity), "type" : ("type", None), "count" : ("cnt", None)}
+    _pk_attrs = ("parent_nucid", "parent_l_seqno")
+    _defaults = {"count" : 0}
 
-        self.pk =   self.parent_nucid  + '-' + str(self.parent_l_seqno)
 
     @property
     def parent(self):
         if(self._parent == None):
-                self._parent =  this._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = '" + self.parent_nucid + "' ")  
+                self._parent =  self._generator("NUCLIDE", "Nuclide", " NUCLIDE.NUC_ID = ? ", (self.parent_nucid,) )
         return self._parent[0]
 
  
     @property
     def parent_level(self):
         if(self._parent_level == None):
-            self._parent_level = this._generator("LEVEL", "Level",   " LEVEL.NUC_ID = '" + self.parent_nucid + "' and LEVEL.SEQNO = " + str(self.parent_l_seqno)  + " ")
+            self._parent_level = self._generator("LEVEL", "Level",   " LEVEL.NUC_ID = ? and LEVEL.SEQNO = ? ", (self.parent_nucid, self.parent_l_seqno) )
         return self._parent_level[0]  
 
 class Dr_annihil(Decay_radiation):
 
     _csv_title = Decay_radiation._csv_title_short
-    
-    def __init__(self):
-        super().__init__()
 
-    def _populate(self,data):
-        super()._populate(data)
+    __slots__ = ()
+
 
 class Dr_atomic(Decay_radiation):
     """Radiation emitted by atomic processes: X-rays, Conversion Electrons, Auger Electrons 
@@ -1847,19 +1878,10 @@ class Dr_atomic(Decay_radiation):
 
 
     _csv_title = "parent_nucid,parent_l_seqno,decay_code,intensity,intensity_unc,intensity_limit,energy,energy_unc,energy_limit,shell"
-   
-    def __init__(self):
-        super().__init__()
-       
-        self.shell = None
-
-    def _populate(self,data):
-        super()._populate(data)
 
-        self.shell = data["type_c"]
-        self.pk = str(data["r_seqno"])
+    __slots__ = ("shell",)
+    _columns = {"shell" : ("type_c", None)}
 
-   
 
 class Dr_x(Dr_atomic):
     """ X-rays emitted 
@@ -1868,11 +1890,8 @@ class Dr_x(Dr_atomic):
     
     """
 
+    __slots__ = ()
 
-    def __init__(self):
-            super().__init__()
-    def _populate(self,data):
-            super()._populate(data)
 
 class Dr_conv_el(Dr_atomic):
     """ Conversion Electrons emitted 
@@ -1881,11 +1900,8 @@ class Dr_conv_el(Dr_atomic):
     
     """
 
+    __slots__ = ()
 
-    def __init__(self):
-            super().__init__()
-    def _populate(self,data):
-            super()._populate(data)
 
 class Dr_auger(Dr_atomic):
     """ Auger Electrons emitted 
@@ -1894,25 +1910,29 @@ class Dr_auger(Dr_atomic):
     
     """
 
-    def __init__(self):
-            super().__init__()
-    def _populate(self,data):
-            super()._populate(data)
+    __slots__ = ()
 
 
 
-def _generator(orm_table: str, nl_class_name: str , filter : str = ''):
+def _generator(orm_table: str, nl_class_name: str , filter : str = '', params = (), as_frame = False, fields = None):
     """ fills an array of ndlab classes by querying the database. 
     
     The 'populate' function of the ndlab entity performs the job, it makes use of reflection.
     The constructed query is a 'select * from tablename' + filter 
+    With a local database, the rows of the result set are passed to 'populate' as they come from the cursor,
+    values are accessed by column name through :py:class:`ndlabdblink.Row`
 
     Args:
 
         orm_table (str):   the name of the :py:mod:`ndlaborm` class for the query, e.g. 'NUCLIDE'
         nl_class_name (str): the name of the ndlab class that will be filled by the query result set, e.g. 'Nuclide'. 
                           The 'populate' function on the class links the result set with the class properties 
-        filter (str) = '' : the filter to produce the where condition in the query 
+        filter (str) = '' : the filter to produce the where condition in the query
+        params (Object) = () : the values of the placeholders in the filter, a tuple for ?, a dict for :name
+        as_frame (bool) = False : True, the columns of the rows in a :py:class:`ndlabframe.Frame` instead of the instances
+        fields (list) = None : the names of the only attributes to read, see the _columns of the class. 
+                          With a local database only their columns are selected. The instances are partial: the other attributes are None,
+                          the links work only if the attributes giving their keys are read, and they are not shared through the identity map
     
     Returns:
  
@@ -1920,35 +1940,181 @@ def _generator(orm_table: str, nl_class_name: str , filter : str = ''):
 
     """
 
+    session = _session()
+    dblink = session.dblink
+
     # overwrite the filter
-    _filter = this._filter if filter == ""  else filter
+    _filter = session._filter if filter == ""  else filter
 
     #print("class ",nl_class_name, " filter ",filter, " _filter ", _filter, dblink.query_check(orm_table+".*",filter), "orm_table" , orm_table)
     
-    if(not dblink.is_query_ok(orm_table+".*",filter)):
-        return ERROR_FILTER_NOT_VALID
-    
     tablename = orm_table if orm_table.endswith("ALL") else orm_table + ".*"
+
+    if(not dblink.is_query_ok(tablename,filter)):
+        return ERROR_FILTER_NOT_VALID
+
+    columns = None
+    if(fields != None):
+        columns = _projection(getattr(this, nl_class_name), fields)
+        if(columns == None):
+            return ERROR_FIELDS_NOT_VALID
+        if(dblink.connected):
+            # the quantities may lack the _unc or _limit column
+            known = dblink.table_columns(ndlaborm._TABLES[orm_table].data["table"])
+            columns = [column for column in columns if column in known]
+
+    if(as_frame):
+        return frame(tablename, _filter, params, columns)
     
     # call to the database
-    jss = json.loads(json_data(tablename , _filter ))
-    #print(" tablename ",tablename)
-    #print(" sql ", dblink.lastsql)
-    #print(" json ", jss)
-    #print("")
+    session.last_fields = tablename
+    session.last_filter = _filter
+    if(dblink.connected):
+        # the rows go straight from the cursor to the entities, no json in between
+        rows = dblink.rows_build(tablename , _filter, params, columns )
+    else:
+        rows = json.loads(json_data(tablename , _filter, params = params ))
+
+    if(rows == None):
+        return ERROR_FILTER_NOT_VALID
+
+    return _instances(rows, nl_class_name, session, _filter, fields)
+
+def _projection(classfact, fields):
+    """The columns holding some attributes of a class, see its _columns
+
+    Args:
+        classfact (type): the ndlab class
+        fields (list): the names of the attributes, e.g. ['energy', 'intensity']
+
+    Returns:
+        list: the columns, with those of the uncertainty and limit of the quantities. None if a name is not an attribute of the class
+    """
+    columns = []
+    for name in fields:
+        if(name not in classfact._columns):
+            print("Error, " + classfact.__name__ + " has no attribute " + str(name) + " to read")
+            return None
+        column, conversion = classfact._columns[name]
+        columns += [column, column + "_unc", column + "_limit"] if conversion is Quantity else [column]
+    return ndlaborm._unique(columns)
+
+def _prefetch_fields(classfact, fields, paths):
+    """The attributes to read for some links to be prefetched, see :py:func:`prefetch`
+
+    Args:
+        classfact (type): the ndlab class
+        fields (list): the names of the attributes asked for, None for all
+        paths (list): the links to prefetch, e.g. ['levels.gammas']
+
+    Returns:
+        list: the fields, with the attributes giving the keys of the first link of each path. None if fields is None
+    """
+    if(fields == None):
+        return None
+    fields = list(fields)
+    for path in paths:
+        name = path.split(".")[0]
+        if(name not in classfact._prefetch):
+            # reported by prefetch
+            continue
+        relation = classfact._prefetch[name][0]
+        for column in relation.source:
+            attr = classfact._column_attrs.get(column, column)
+            if(attr in classfact._columns and attr not in fields):
+                fields.append(attr)
+    return fields
+
+def _related(relation, params):
+    """ fills an array of ndlab classes following a :py:class:`ndlaborm.Relation`
+
+    With a local database the compiled sql of the relation is executed, skipping the parsing of the filter.
+    Otherwise the relation is followed as any filter, see :py:meth:`ndlab._generator`.
+    When the keys are the :code:`_identity` of the entity, the instance already in the identity map is returned without a query
+
+    Args:
+
+        relation (ndlaborm.Relation): the relation, with the name of the ndlab class in its entity attribute
+        params (tuple): the values of the keys
+
+    Returns:
+
+        Object[]: list of instances of the relation's entity
+    """
+    session = _session()
+    dblink = session.dblink
+
+    # e.g. the nuclide of a gamma: the key of the identity map is known before the query
+    classfact = getattr(this, relation.entity)
+    columns = relation.columns
+    if(classfact._identity != None and columns != None and sorted(columns) == sorted(classfact._identity)):
+        values = dict(zip(columns, params))
+        obj = session.identity_map.get((classfact, "-".join([str(values[column]) for column in classfact._identity])))
+        if(obj is not None):
+            return [obj]
+
+    if(not dblink.connected):
+        return _generator(relation.table, relation.entity, relation.filter, params)
+
+    session.last_fields = relation.fields
+    session.last_filter = relation.filter
+    rows = dblink.rows_exec(relation.sql(), params)
+    if(rows == None):
+        return ERROR_FILTER_NOT_VALID
+
+    return _instances(rows, relation.entity, session, relation.filter)
+
+def _instances(rows, nl_class_name, session, _filter, fields = None):
+    """ the ndlab instances of the rows of a result set
+
+    Args:
+
+        rows (Object): the rows, see :py:class:`ndlabdblink.Row`
+        nl_class_name (str): the name of the ndlab class
+        session (Session): the session the instances come from
+        _filter (str): the filter that produced the rows
+        fields (list): the only attributes to populate, None for all. The partial instances are neither lazy nor in the identity map
+
+    Returns:
+
+        Object[]: list of  nl_class_name instances
+    """
     # the return array
     objs = []
 
     # instanciate the factory
     classfact =  getattr(this, nl_class_name)
+    identity = classfact._identity
+    entities = session.identity_map
+    lazy = session.lazy
+
+    if(fields != None):
+        for row in rows:
+            obj = classfact._new()
+            obj.myfilter = _filter
+            obj._session = session
+            obj._populate(row, fields)
+            objs.append(obj)
+        return objs
 
     # instanciate and fill the entities
-    for js in jss:
-        obj = classfact()
-        # let the object remember its filter
+    for row in rows:
+        if(identity != None):
+            # the pk as _populate sets it
+            key = (classfact, "-".join([str(row[column]) for column in identity]))
+            obj = entities.get(key)
+            if(obj is not None):
+                objs.append(obj)
+                continue
+
+        # a lazy instance keeps the row, decoded by __getattr__
+        obj = classfact._new(row if lazy else None)
+        # let the object remember its filter, and where it comes from
         obj.myfilter = _filter
-        obj._populate(js)
-        objs.append(obj)
+        obj._session = session
+        if(not lazy):
+            obj._populate(row)
+        objs.append(obj if identity == None else entities.add(key, obj))
 
     return objs
 
@@ -1957,19 +2123,19 @@ def query_check(table, conditions=""):
 
     interface to sqlbuilder
     """
-    return dblink.query_check(table, conditions)
+    return _session().dblink.query_check(table, conditions)
 
 def is_query_ok(table, conditions=""):  
     """ Check if users parameters produce a valid query, return true/false
 
     interface to sqlbuilder
     """
-    return dblink.is_query_ok(table, conditions)
+    return _session().dblink.is_query_ok(table, conditions)
 
 def check_filter(filter, function):
     """Whether a filter is okay when applied to a given function
 
-    Filter should query only one table (besides embedded foreign keys)
+    The tables in the filter should be linked by a foreign key to the table of the function (besides embedded foreign keys)
 
     Args:
         filter (str): the filter
@@ -1979,7 +2145,7 @@ def check_filter(filter, function):
      
     """
     table = function.__name__[:-1].upper() + ".*"
-    return dblink.is_query_ok(table,filter)
+    return _session().dblink.is_query_ok(table,filter)
 
 def nuclide(nucid):
     """A :py:class:`ndlab.Nuclide` from its identifyer
@@ -1989,217 +2155,474 @@ def nuclide(nucid):
     Returns:
         Nuclide : the :ref:`NUCLIDE <NUCLIDE>` with this id
     """
-    old_filter = this._filter
-    this._filter = "NUCLIDE.NUC_ID = '" + nucid.upper()  + "'"
-    nuc = nuclides()
-    this._filter = old_filter
+    nuc = nuclides("NUCLIDE.NUC_ID = ?", (nucid.upper(),))
     if (nuc == None or len(nuc) == 0):
         return None
 
     return nuc[0]
 
-def nuclides(filter = ""):
+def nuclides(filter = "", params = (), prefetch = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Nuclide`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`NUCLIDE <NUCLIDE>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       prefetch (list): the links to load for all the instances at once, see :py:func:`prefetch`
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['z', 'n', 'abundance'], see :py:func:`ndlab._generator`. The attributes giving the keys of the links to prefetch are read too
     Returns:
         Nuclide : 
     """
-    return _generator("NUCLIDE","Nuclide", filter)
+    objs = _generator("NUCLIDE","Nuclide", filter, params, as_frame, _prefetch_fields(Nuclide, fields, prefetch))
+    if(len(prefetch) > 0 and not as_frame and objs.__class__ is not str):
+        objs = this.prefetch(objs, *prefetch)
+    return objs
+
+def nuclides_by_id(nucids, as_dict = False):
+    """The :py:class:`ndlab.Nuclide` of many identifiers, fetched with a few queries instead of one each
+
+    Args:
+        nucids (list): mass+element symbol of each nuclide, e.g. ['135XE', '60CO']
+        as_dict (bool): False, a list in the order of nucids, with None for those not found. 
+                        True, a dict upper-case nucid -> Nuclide, of those found
+    Returns:
+        Object : the list or the dict
+    """
+    found = _by_keys("NUCLIDE", "Nuclide", ["NUCLIDE.NUC_ID"], ["nucid"], [(nucid.upper(),) for nucid in nucids])
+    if(found.__class__ is str): return found
+    keys = [nucid.upper() for nucid in nucids]
+    if(as_dict):
+        return {key : found[(key,)] for key in keys if (key,) in found}
+    return [found.get((key,)) for key in keys]
+
+def levels_by_key(keys, as_dict = False):
+    """The :py:class:`ndlab.Level` of many (nucid, seqno) keys, fetched with a few queries instead of one each
+
+    Args:
+        keys (list): (nucid, seqno) of each level, e.g. [('135XE', 0), ('135XE', 1)]
+        as_dict (bool): False, a list in the order of keys, with None for those not found. 
+                        True, a dict (upper-case nucid, seqno) -> Level, of those found
+    Returns:
+        Object : the list or the dict
+    """
+    keys = [(key[0].upper(), key[1]) for key in keys]
+    found = _by_keys("LEVEL", "Level", ["LEVEL.NUC_ID", "LEVEL.SEQNO"], ["nucid", "l_seqno"], keys)
+    return _by_keys_result(found, keys, as_dict)
+
+def l_decays_by_key(keys, as_dict = False):
+    """The :py:class:`ndlab.L_decay` of many (nucid, level seqno, decay code) keys, fetched with a few queries instead of one each
+
+    A key matches a decay for each daughter, e.g. in the decays whose daughter is an isomer, hence a list of decays for each key
+
+    Args:
+        keys (list): (nucid, seqno, code) of each decay, e.g. [('135XE', 0, DECAY_Bm)]
+        as_dict (bool): False, a list in the order of keys, with the list of L_decay of each, empty for those not found. 
+                        True, a dict (upper-case nucid, seqno, code) -> list of L_decay, of those found
+    Returns:
+        Object : the list or the dict
+    """
+    keys = [(key[0].upper(), key[1], key[2]) for key in keys]
+    found = _by_keys("L_DECAY", "L_decay", ["L_DECAY.NUC_ID", "L_DECAY.LEVEL_SEQNO", "L_DECAY.MODE"], ["nucid", "l_seqno", "code"], keys, True)
+    return _by_keys_result(found, keys, as_dict, [])
+
+def _by_keys_result(found, keys, as_dict, missing = None):
+    """The result of a bulk lookup, see :py:func:`levels_by_key`. missing stands for the keys not found in the list
+    """
+    if(found.__class__ is str): return found
+    if(as_dict):
+        return {key : found[key] for key in keys if key in found}
+    return [found.get(key, missing) for key in keys]
+
+def _by_keys(orm_table, nl_class_name, fields, attrs, keys, many = False):
+    """Fetches the instances of many keys with IN queries, one for each chunk of keys, see :py:func:`_in_filters`
+
+    Args:
+        orm_table (str): the :py:mod:`ndlaborm` class, e.g. 'LEVEL'
+        nl_class_name (str): the ndlab class, e.g. 'Level'
+        fields (list): the :py:mod:`ndlaborm` fields of the key, e.g. ['LEVEL.NUC_ID', 'LEVEL.SEQNO']
+        attrs (list): the attributes of the ndlab class with the values of fields, e.g. ['nucid', 'l_seqno']
+        keys (list): the tuples of values
+        many (bool): False, the fields are the key of the table, one instance for each key. True, the list of all the instances of each key
+
+    Returns:
+        dict: key tuple -> instance, or list of instances, for the keys found. The error message if a query fails
+    """
+    found = {}
+    for filter, params in _in_filters(fields, keys):
+        objs = _generator(orm_table, nl_class_name, filter, params)
+        if(objs.__class__ is str): return objs
+        for obj in objs:
+            key = tuple([getattr(obj, attr) for attr in attrs])
+            if(many):
+                found.setdefault(key, []).append(obj)
+            else:
+                found.setdefault(key, obj)
+
+    return found
+
+def _in_filters(fields, keys):
+    """The filters matching fields with many keys, in chunks
+
+    Each chunk is within :py:data:`IN_PLACEHOLDERS`, and is padded to a power of two by repeating a key, 
+    so that the few filters produced are compiled once, see :py:meth:`ndlaborm.Sqlbuilder.compiled`
+
+    Args:
+        fields (list): the :py:mod:`ndlaborm` fields of the key, e.g. ['LEVEL.NUC_ID', 'LEVEL.SEQNO']
+        keys (list): the tuples of values
+
+    Returns:
+        generator: (filter, params) of each chunk
+    """
+    keys = list(dict.fromkeys(keys))
+    batch = 1
+    while(batch * 2 * len(fields) <= IN_PLACEHOLDERS):
+        batch *= 2
+
+    for start in range(0, len(keys), batch):
+        chunk = keys[start : start + batch]
+        size = 1
+        while(size < len(chunk)):
+            size *= 2
+        chunk += [chunk[-1]] * (size - len(chunk))
+
+        if(len(fields) == 1):
+            filter = fields[0] + " in ( " + " , ".join(["?"] * size) + " )"
+        else:
+            row = "( " + " , ".join(["?"] * len(fields)) + " )"
+            filter = "( " + " , ".join(fields) + " ) in ( values " + " , ".join([row] * size) + " )"
+
+        yield filter, tuple([value for key in chunk for value in key])
+
+def prefetch(entities, *paths):
+    """Loads a link of many entities at once, with one query for all of them instead of one each
+
+    The instances are attached to the entities as if each had followed the link, e.g. after 
+    :code:`prefetch(levels, "gammas")` calling :code:`level.gammas()` does not query the database.
+    A path follows the links from the instances loaded, e.g. :code:`prefetch(nucs, "levels.gammas.end_level")` loads
+    the levels of the nuclides, the gammas of these levels, and the end level of these gammas, with three queries.
+    The links that can be prefetched are listed in the _prefetch of each class, the list of :py:class:`Nuclide`
+    from :py:class:`L_decay` (e.g. parents, daughters) are not among them
+
+    Args:
+        entities (list): the entities, e.g. a list of :py:class:`Level`
+        paths (str): the names of the links separated by a dot, e.g. "gammas" or "decays.gammas"
+
+    Returns:
+        list: the entities, or an error message
+    """
+    for path in paths:
+        level = entities
+        for name in path.split("."):
+            level = _prefetch(level, name)
+            if(level.__class__ is str): return level
+    return entities
+
+def _prefetch(entities, name):
+    """Loads a link of many entities, see :py:func:`prefetch`
+
+    Returns:
+        list: the instances linked to the entities, without doublers, or an error message
+    """
+    groups = {}
+    for entity in entities:
+        groups.setdefault((entity.__class__, entity._session), []).append(entity)
+
+    linked = {}
+    for (cls, session), group in groups.items():
+        if(name not in cls._prefetch):
+            print("Error, " + cls.__name__ + " has no link " + name + " to prefetch")
+            return ERROR_PREFETCH_NOT_VALID
+        relation, attr, first = cls._prefetch[name]
+
+        # the entities to load, by key
+        keys = {}
+        for entity in group:
+            value = getattr(entity, attr)
+            if(value != None and getattr(entity, attr + "_filter", "") == ""):
+                continue
+            key = entity._keys(relation)
+            if(None in key): continue
+            keys.setdefault(key, []).append(entity)
+
+        related = {key : [] for key in keys}
+        order = (" ORDER BY " + relation.order) if relation.order != "" else ""
+        with (session or _session()):
+            for filter, params in _in_filters(relation.keys, list(keys)):
+                objs = _generator(relation.table, relation.entity, filter + order, params)
+                if(objs.__class__ is str): return objs
+                for obj in objs:
+                    related[tuple([getattr(obj, obj._column_attrs.get(column, column)) for column in relation.columns])].append(obj)
+
+        for key, group_keys in keys.items():
+            objs = related[key]
+            if(first and len(objs) == 0): continue
+            for entity in group_keys:
+                setattr(entity, attr, objs[0] if first else list(objs))
+                if(hasattr(entity, attr + "_filter")):
+                    setattr(entity, attr + "_filter", "")
+
+        for entity in group:
+            value = getattr(entity, attr)
+            for obj in ([value] if first else (value or [])):
+                if(obj != None): linked[id(obj)] = obj
+
+    return list(linked.values())
    
-def levels(filter = ""):
+def levels(filter = "", params = (), prefetch = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Level`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`LEVEL <LEVEL>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       prefetch (list): the links to load for all the instances at once, see :py:func:`prefetch`
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'half_life'], see :py:func:`ndlab._generator`. The attributes giving the keys of the links to prefetch are read too
     Returns:
         Level : 
     """
-    return _generator("LEVEL","Level", filter)
+    objs = _generator("LEVEL","Level", filter, params, as_frame, _prefetch_fields(Level, fields, prefetch))
+    if(len(prefetch) > 0 and not as_frame and objs.__class__ is not str):
+        objs = this.prefetch(objs, *prefetch)
+    return objs
 
-def gammas(filter = ""):
+def gammas(filter = "", params = (), prefetch = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Gamma`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`GAMMA <GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       prefetch (list): the links to load for all the instances at once, see :py:func:`prefetch`
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'rel_photon_intens'], see :py:func:`ndlab._generator`. The attributes giving the keys of the links to prefetch are read too
     Returns:
         Gamma : 
     """
-    return _generator("GAMMA","Gamma", filter)
+    objs = _generator("GAMMA","Gamma", filter, params, as_frame, _prefetch_fields(Gamma, fields, prefetch))
+    if(len(prefetch) > 0 and not as_frame and objs.__class__ is not str):
+        objs = this.prefetch(objs, *prefetch)
+    return objs
 
-def l_decays(filter = ""):
+def l_decays(filter = "", params = (), prefetch = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.L_decays`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`L_DECAY <L_DECAY>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       prefetch (list): the links to load for all the instances at once, see :py:func:`prefetch`
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['code', 'perc'], see :py:func:`ndlab._generator`. The attributes giving the keys of the links to prefetch are read too
     Returns:
         L_decay : 
     """
-    return _generator("L_DECAY","L_decay", filter)
+    objs = _generator("L_DECAY","L_decay", filter, params, as_frame, _prefetch_fields(L_decay, fields, prefetch))
+    if(len(prefetch) > 0 and not as_frame and objs.__class__ is not str):
+        objs = this.prefetch(objs, *prefetch)
+    return objs
 
-def decay_codes(filter = ""):
-     return _generator("DECAY_CODE","Decay_code", filter)
+def decay_codes(filter = "", params = ()):
+     return _generator("DECAY_CODE","Decay_code", filter, params)
 
-def dr_alphas(filter = ""):
+def dr_alphas(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_alpha`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_ALPHA <DR_ALPHA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_alpha : 
     """
 
-    return _generator("DR_ALPHA","Dr_alpha", filter)
+    return _generator("DR_ALPHA","Dr_alpha", filter, params, as_frame, fields)
 
-def dr_gammas(filter = ""):
+def dr_gammas(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_gamma`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_gamma : 
     """
-    return _generator("DR_GAMMA","Dr_gamma", filter)
+    return _generator("DR_GAMMA","Dr_gamma", filter, params, as_frame, fields)
 
-def dr_annihil(filter = ""):
+def dr_annihil(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_annihil`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_annihil : 
     """
 
-    return _generator("DR_ANNIHIL","Dr_annihil", filter) 
+    return _generator("DR_ANNIHIL","Dr_annihil", filter, params, as_frame, fields) 
 
-def dr_beta_ms(filter = ""):
+def dr_beta_ms(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_betam`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_betam : 
     """
     
-    return _generator("DR_BETAM","Dr_betam", filter)
+    return _generator("DR_BETAM","Dr_betam", filter, params, as_frame, fields)
 
-def dr_anti_nus(filter = ""):
+def dr_anti_nus(filter = "", params = (), as_frame = False, fields = None):
      """A list of :py:class:`ndlab.Dr_anti_nu`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_anti_nu : 
     """     
      
-     return _generator("DR_ANTI_NU","Dr_anti_nu", filter)
+     return _generator("DR_ANTI_NU","Dr_anti_nu", filter, params, as_frame, fields)
 
-def dr_nus(filter = ""):
+def dr_nus(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_nu`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_nu : 
     """
 
-    return _generator("DR_NU","Dr_nu", filter)
+    return _generator("DR_NU","Dr_nu", filter, params, as_frame, fields)
 
-def dr_beta_ps(filter = ""):
+def dr_beta_ps(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_betap`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_betap : 
     """
      
-    return _generator("DR_BETAP","Dr_betap", filter)
+    return _generator("DR_BETAP","Dr_betap", filter, params, as_frame, fields)
 
-def dr_xs(filter = ""):
+def dr_xs(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_x`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_x : 
     """
      
-    return _generator("DR_X","Dr_x", filter)
+    return _generator("DR_X","Dr_x", filter, params, as_frame, fields)
 
-def dr_photon_tot(filter = ""):
+def dr_photon_tot(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_photon_tot`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_photon_tot : 
     """
 
-    return _generator("DR_PHOTON_TOTAL","Dr_photon_tot", filter)     
+    return _generator("DR_PHOTON_TOTAL","Dr_photon_tot", filter, params, as_frame, fields)     
 
-def dr_convels(filter = ""):
+def dr_convels(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_conv_el`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_conv_el : 
     """
 
-    return _generator("DR_CONV_EL","Dr_conv_el", filter)
+    return _generator("DR_CONV_EL","Dr_conv_el", filter, params, as_frame, fields)
 
-def dr_augers(filter = ""):
+def dr_augers(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_Augher`  
 
     Shells included are K and L
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_Auger : 
     """
 
-    return _generator("DR_AUGER","Dr_auger", filter)
+    return _generator("DR_AUGER","Dr_auger", filter, params, as_frame, fields)
 
-def dr_delayeds(filter = ""):
+def dr_delayeds(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Dr_delayed`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['energy', 'intensity'], see :py:func:`ndlab._generator`
     Returns:
         Dr_delayed : 
     """
 
-    return _generator("DR_DELAYED","Dr_delayed", filter)
+    return _generator("DR_DELAYED","Dr_delayed", filter, params, as_frame, fields)
 
-def cum_fys(filter = ""):
+def cum_fys(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Cum_fy`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['thermal', 'fast'], see :py:func:`ndlab._generator`
     Returns:
         Cum_fy : 
     """
 
-    return _generator("CUM_FY","Cum_fy", filter)
+    return _generator("CUM_FY","Cum_fy", filter, params, as_frame, fields)
 
-def ind_fys(filter = ""):
+def ind_fys(filter = "", params = (), as_frame = False, fields = None):
     """A list of :py:class:`ndlab.Ind_fy`  
     
     Args:
        filter (str): :ref:`filter <filter-label>`  passed to the function by the user. It may contain only fields of the :ref:`DR_GAMMA <DR_GAMMA>` entity  
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       as_frame (bool): True, the columns of the result as NumPy arrays in a :py:class:`ndlabframe.Frame`, instead of the list
+       fields (list): the only attributes to read, e.g. ['thermal', 'fast'], see :py:func:`ndlab._generator`
     Returns:
         Ind_fy : 
     """
 
-    return _generator("IND_FY","Ind_fy", filter)
+    return _generator("IND_FY","Ind_fy", filter, params, as_frame, fields)
 
 def setfilter(where: str):
-    ''' appendeds a filter to each query'''
+    ''' appendeds a filter to each query of the session in use'''
 
-    this._filter = where   
+    _session()._filter = where   
 
 def remove_doublers(doublers):
     """ removes doublers from a list
@@ -2212,79 +2635,181 @@ def remove_doublers(doublers):
     Returns:
         list: the list with only singlers  
     """
-    if(len(doublers) == 0): return doublers
-
+    pks = set()
     singlers = []
-    pks = []
-    
     for n in doublers:
-        if n.pk in pks: continue
-        singlers.append(n)
-        pks.append(n.pk)
-
+        if(n.pk not in pks):
+            pks.add(n.pk)
+            singlers.append(n)
     return singlers
 
 
 def getfilter():
-   return this._filter
+   return _session()._filter
 
-def json_data(fields , filter ):
+def json_data(fields , filter, typed = False, params = () ):
     """JSON data from a query
 
     Args:
         fields (str): list of comma-separated :py:mod:`ndlaborm` fields
         filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        typed (bool): False, all the values are strings, null as "None". True, numbers and nulls are given as such
+        params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
 
     Returns:
 
         str: JSON structure with the result set    
     """
-    return _data_deliverer ('json', fields , filter )
+    return _data_deliverer ('json_typed' if typed else 'json', fields , filter, params )
 # string    
-def csv_data(fields , filter ):
+def csv_data(fields , filter, params = () ):
     """CSV data from a query
 
     Args:
         fields (str): list of comma-separated :py:mod:`ndlaborm` fields
         filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
 
     Returns:
 
         str: CSV structure with the data    
     """
 
-    return _data_deliverer ('csv', fields , filter )
+    return _data_deliverer ('csv', fields , filter, params )
     
-def _data_deliverer(return_type,fields , filter):
+def csv_stream(fields, filter, batch_size = dl.CSV_BATCH, params = ()):
+    """CSV data from a query, produced chunk by chunk
+
+    Memory stays flat regardless of the size of the result: rows are fetched batch_size at a time, 
+    and each batch is turned into a chunk of text. The chunks joined give the same text as :py:meth:`ndlab.csv_data`
+
+    Args:
+        fields (str): list of comma-separated :py:mod:`ndlaborm` fields
+        filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        batch_size (int): number of rows in each chunk
+        params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+
+    Returns:
+
+        generator: the chunks of the CSV
+    """
+    return _data_stream('csv', fields, filter, batch_size, params)
+
+def csv_write(out, fields, filter, batch_size = dl.CSV_BATCH, params = ()):
+    """Writes the CSV data from a query into a file-like object, e.g. an open file or a socket stream
+
+    See :py:meth:`ndlab.csv_stream`
+
+    Args:
+        out (Object): file-like object with a write(str) method
+        fields (str): list of comma-separated :py:mod:`ndlaborm` fields
+        filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        batch_size (int): number of rows written at a time
+        params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+    """
+    for chunk in csv_stream(fields, filter, batch_size, params):
+        out.write(chunk)
+
+def json_stream(fields, filter, batch_size = dl.CSV_BATCH, params = ()):
+    """NDJSON data from a query, produced chunk by chunk
+
+    Each row is a JSON object on its own line, with numbers and nulls given as such. 
+    As in :py:meth:`ndlab.csv_stream`, rows are fetched batch_size at a time
+
+    Args:
+        fields (str): list of comma-separated :py:mod:`ndlaborm` fields
+        filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        batch_size (int): number of rows (lines) in each chunk
+        params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+
+    Returns:
+
+        generator: the chunks of the NDJSON
+    """
+    return _data_stream('ndjson', fields, filter, batch_size, params)
+
+def json_write(out, fields, filter, batch_size = dl.CSV_BATCH, params = ()):
+    """Writes the NDJSON data from a query into a file-like object, e.g. an open file or a socket stream
+
+    See :py:meth:`ndlab.json_stream`
+
+    Args:
+        out (Object): file-like object with a write(str) method
+        fields (str): list of comma-separated :py:mod:`ndlaborm` fields
+        filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        batch_size (int): number of rows written at a time
+        params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+    """
+    for chunk in json_stream(fields, filter, batch_size, params):
+        out.write(chunk)
+
+def _data_stream(return_type, fields, filter, batch_size, params = ()):
+    """Delivers the data chunk by chunk, see :py:meth:`ndlab._data_deliverer`
+
+    Args:
+        
+        return_type (str): 'csv' or 'ndjson' 
+        fields (str): list of comma-separated :py:mod:`ndlaborm` fields
+        filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        batch_size (int): number of rows in each chunk
+        params (Object): the values of the placeholders in the filter
+
+    Returns:
+
+        generator: the chunks
+    """
+    session = _session()
+    dblink = session.dblink
+    session.last_fields = fields
+    session.last_filter = filter
+
+    if(not dblink.is_query_ok(fields,filter)):
+        yield ERROR_FILTER_NOT_VALID
+        return
+
+    if(dblink.connected):
+        chunks = dblink.data_stream(return_type, fields, filter, batch_size, params)
+        if(chunks == None):
+            yield 'message \n error in the query' if return_type == 'csv' else '{"message":"error in the query"}\n'
+            return
+        yield from chunks
+    else:
+        response = io.TextIOWrapper(_httprequest(return_type,fields, dblink.bind(filter, params)), encoding = "utf8")
+        yield from iter(lambda: response.read(io.DEFAULT_BUFFER_SIZE), "")
+
+def _data_deliverer(return_type,fields , filter, params = ()):
     """Delivers the data by querying the database
 
-    It refers to dblink, the variable with an instance of ndlabdblink.DbLink class
+    It refers to the dblink of the session in use, an instance of ndlabdblink.DbLink class
     that handles the database
 
     It checks whether the db is local, or is remote and accessed through http
 
     Args:
         
-        return_type (str): 'csv' or 'json' 
+        return_type (str): 'csv', 'json', 'json_typed', or 'ndjson' 
         fields (str): list of comma-separated :py:mod:`ndlaborm` fields
         filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        params (Object): the values of the placeholders in the filter. Inlined in the filter when the db is remote
 
     Returns:
 
-        str: either a csv or a json structure with the data 
+        str: either a csv or a json structure with the data
 
     """
-    this.last_fields = fields
-    this.last_filter = filter
+    session = _session()
+    dblink = session.dblink
+    session.last_fields = fields
+    session.last_filter = filter
 
 
     if(not dblink.is_query_ok(fields,filter)):
         return ERROR_FILTER_NOT_VALID
 
     if(dblink.connected):
-        return dblink.data_deliverer (return_type, fields , filter )
+        return dblink.data_deliverer (return_type, fields , filter, params )
     else:
-        return _httprequest(return_type,fields, filter).read().decode("utf8").strip()
+        return _httprequest(return_type,fields, dblink.bind(filter, params)).read().decode("utf8").strip()
 
 # dblink
 #def force_clean_query(force):
@@ -2360,7 +2885,7 @@ def pandas_df_nl(list, pandas):
 
     
 
-def pandas_df(fields, filter, pandas):
+def pandas_df(fields, filter, pandas, params = ()):
     """Creates a dataframe 
     
     If the database is local, calls pandas'  read_sql method using :py:class:`query_build` to build the query, and :py:class:`query_con`
@@ -2372,28 +2897,59 @@ def pandas_df(fields, filter, pandas):
        fields (str): list of comma-separated :py:mod:`ndlaborm` fields
        filter (str): filter condition built with :py:mod:`ndlaborm` fields
        pandas (Object): the pandas module imported in the calling environment. E.g. pass when :code:`pd` when using :code:`import pandas as pd`
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
 
     Returns:
         Dataframe: the pandas dataframe
 
     """
+    dblink = _session().dblink
     if(dblink.connected):
         try:
-             return pandas.read_sql(query_build(fields, filter), query_con())
-        except:
-            try:
-                # try to put blank spaces where needed
-                force = dblink._sqlbuilder.force_clean 
-                dblink.force_clean_query(True)
-                qry = query_build(fields, filter)
-                dblink.force_clean_query(force)
-                return pandas.read_sql(qry, query_con())
-            except Exception as e:
-                print("Error , check the rules for the fields and filter parameters\n" +str(e))
-                return None
+             return pandas.read_sql(query_build(fields, filter), query_con(), params = params)
+        except Exception as e:
+            print("Error , check the rules for the fields and filter parameters\n" +str(e))
+            return None
     else:
-        return pandas.read_csv(pandas_csv_web(fields, filter) )
+        return pandas.read_csv(pandas_csv_web(fields, dblink.bind(filter, params)) )
+
 
+def frame(fields, filter = "", params = (), columns = None):
+    """The columns of a query as NumPy arrays, see :py:class:`ndlabframe.Frame`
+
+    Takes a few bytes per value, where the instances of the classes take about a kilobyte per row, 
+    and allows vectorized computations, e.g. :code:`f = frame("DR_GAMMA", filter)` then :code:`f["energy"] * f["intensity"]`.
+    NumPy is imported at the first call
+
+    Args:
+       fields (str): list of comma-separated :py:mod:`ndlaborm` fields, or an entity for all its columns, e.g. 'DR_GAMMA'
+       filter (str): filter condition built with :py:mod:`ndlaborm` fields
+       params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+       columns (list): with an entity, the only columns of its table to select, e.g. ['energy', 'energy_unc']. Ignored when the database is remote
+
+    Returns:
+        Frame: the frame, or None if the query fails or NumPy is not installed
+    """
+    try:
+        ndlabframe._numpy()
+    except ImportError:
+        print("Error, frames need NumPy, e.g. pip install numpy")
+        return None
+
+    session = _session()
+    dblink = session.dblink
+    if(fields.strip() in ndlaborm._TABLES):
+        fields = fields.strip() + ".*"
+
+    if(dblink.connected):
+        result = dblink.tuples_build(fields, filter, params, columns)
+        if(result == None): return None
+        return ndlabframe.Frame(*result)
+
+    rows = json.loads(json_data(fields, filter, True, params))
+    if(rows.__class__ is not list): return None
+    keys = list(rows[0].keys()) if len(rows) > 0 else []
+    return ndlabframe.Frame(keys, [tuple([row[key] for key in keys]) for row in rows])
 
 def pandas_csv_web(fields, filter=""):
     """CSV data from the web server
@@ -2418,7 +2974,82 @@ def query_con():
 
       Connection: The connection to the database
     """
-    return dblink._con_lite
+    return _session().dblink._con_lite
+
+def load_in_memory():
+    """Loads the database in memory, and serves the queries of the session in use from there
+
+    The whole database is copied at once: worth it when many queries follow, e.g. in batch jobs navigating the entities.
+    To start a session already in memory, use :code:`Session(in_memory=True)`
+    """
+    _session().dblink.load_in_memory()
+
+def pragmas():
+    """The sqlite PRAGMA settings in effect for the session in use
+
+    They come from the profile, and the overrides, given when creating the session, 
+    e.g. :code:`Session(profile="large-scan", pragmas={"cache_size" : -65536})`.
+    See :py:data:`ndlabdblink.PRAGMA_PROFILES`
+
+    Returns:
+        dict: pragma name -> value
+    """
+    return _session().dblink.pragmas()
+
+def cache_info():
+    """The counters of the result cache of the session in use
+
+    The cache is off by default, turn it on when creating the session, e.g. :code:`Session(cache=True, cache_entries=1024)`.
+    Repeated queries, like the same nuclide looked up along decay chains, are then served from memory
+
+    Returns:
+        dict: hits, misses, entries, cells, and the limits. None when the cache is off
+    """
+    return _session().dblink.cache_info()
+
+def cache_clear():
+    """Empties the result cache of the session in use
+    """
+    _session().dblink.cache_clear()
+
+def keyset(keys):
+    """Loads many keys in the database, to query their rows with one join instead of a query, or a long IN list, each
+
+    The keyset gives the condition to add to any filter, e.g.
+
+    | with keyset([fy.daughter_nucid for fy in cum_fys("CUM_FY.PARENT.NUC_ID = '235U'")]) as ks:
+    |     gammas = dr_gammas(ks.filter("DR_GAMMA.PARENT_NUC_ID"))
+    |     df = pandas_df("DR_GAMMA.ENERGY, DR_GAMMA.INTENSITY", ks.filter("DR_GAMMA.PARENT_NUC_ID"), pd)
+
+    Keys of several values are tuples, matched with as many fields, e.g. :code:`ks.filter("LEVEL.NUC_ID", "LEVEL.SEQNO")`.
+    The keys are seen only by the queries of the calling thread, within the session in use. 
+
+    Args:
+        keys (list): the keys, each a value or a tuple of values
+
+    Returns:
+        Keyset: see :py:class:`ndlabdblink.Keyset`. None with a remote database
+    """
+    ks = _session().dblink.keyset(keys)
+    if(ks == None):
+        print("keysets need a local database")
+    return ks
+
+def query_plan(fields, filter="", params = ()):
+    """How the database runs the query of fields and filter, to find out why a query is slow
+
+    E.g. :code:`ndlab.query_plan("GAMMA.ENERGY", "GAMMA.START_LEVEL.ENERGY > 1000")["full_scans"]`
+
+    Args:
+        fields (str): list of comma-separated :py:mod:`ndlaborm` fields
+        filter (str): filter condition built with :py:mod:`ndlaborm` fields
+        params (Object): the values of the placeholders in the filter, a tuple for ?, a dict for :name
+
+    Returns:
+        dict: the sql, the steps of sqlite's EXPLAIN QUERY PLAN, the full scans of large tables, and the joins without an index.
+        See :py:meth:`ndlabdblink.Dblink.query_plan`. None with a remote database
+    """
+    return _session().dblink.query_plan(fields, filter, params)
 
 def query_build(fields, filter=""):
     """The SQL query associated with fields and filter
@@ -2432,14 +3063,14 @@ def query_build(fields, filter=""):
 
       
     """
-    return dblink.query_build(fields, filter)
+    return _session().dblink.query_build(fields, filter)
 
 def _httprequest(return_type, fields, filter=""):
     """ Queries the database through http
 
 
     Args:
-        return_type (str): 'csv' or 'json' 
+        return_type (str): 'csv', 'json', 'json_typed', or 'ndjson' 
         fields (str): list of comma-separated :py:mod:`ndlaborm` fields
         filter (str): filter condition built with :py:mod:`ndlaborm` fields
 
@@ -2466,12 +3097,12 @@ def _httprequest(return_type, fields, filter=""):
 
 
 def print_shell():
-    res = dblink.query_exec("select distinct type_c from decay_radiations order by 1")
+    res = _session().dblink.query_exec("select distinct type_c from decay_radiations order by 1")
     for r in res:
         print("SHELL_" + r[0] + " = '" + r[0]+ "'")
 
 def print_transition():
-    res = dblink.query_exec("select distinct  b_trans_type from decay_radiations order by 1")
+    res = _session().dblink.query_exec("select distinct  b_trans_type from decay_radiations order by 1")
     for r in res:
         print("TRANS_" + r[0] + " = '" + r[0]+ "'")
 
@@ -6,10 +6,528 @@ Anything that uses the db connection is here. Users' request are received, passe
 and executed here
 """
 
+import collections
+import itertools
+import math
 import os.path
+import pathlib
 import ndlaborm
+import ndlaboptimizer
 import sqlite3
+import threading
 import traceback
+import weakref
+from json.encoder import encode_basestring
+
+"""Default number of idle connections to the database kept open, see :py:class:`Connection_pool`"""
+POOL_SIZE = 4
+
+"""PRAGMA settings applied to each connection, by profile name. cache_size is in KiB when negative, mmap_size in bytes
+
+- default: for interactive use, a larger page cache and some memory-mapped I/O
+- large-scan: for full-chart scans over decay_radiations, gammas, and levels
+- low-memory: for small containers, sqlite's own minimal footprint
+"""
+PRAGMA_PROFILES = {
+    "default" :    {"cache_size" : -16384,  "mmap_size" : 67108864,   "temp_store" : "memory"},
+    "large-scan" : {"cache_size" : -262144, "mmap_size" : 1073741824, "temp_store" : "memory", "threads" : 4},
+    "low-memory" : {"cache_size" : -1024,   "mmap_size" : 0,          "temp_store" : "file"}
+}
+
+def pragma_settings(profile = "default", pragmas = None):
+    """The PRAGMA settings of a profile, with explicit overrides
+
+    Args:
+        profile (str): name of one of the :py:data:`PRAGMA_PROFILES`
+        pragmas (dict): settings overriding the profile ones, e.g. {"cache_size" : -4096}
+
+    Returns:
+        dict: the settings
+    """
+    if(profile not in PRAGMA_PROFILES):
+        raise ValueError("unknown profile '" + str(profile) + "', use one of " + ", ".join(PRAGMA_PROFILES.keys()))
+
+    settings = dict(PRAGMA_PROFILES[profile])
+    settings.update(pragmas if pragmas != None else {})
+    for name, value in settings.items():
+        # they are pasted in the sql
+        if(not name.isidentifier() or not (value.__class__ is int or str(value).isidentifier())):
+            raise ValueError("invalid pragma " + str(name) + " = " + str(value))
+
+    return settings
+
+"""Default number of rows fetched at a time when streaming a result set"""
+CSV_BATCH = 1000
+
+def _json_value(v):
+    """The json text of a value from the db: numbers stay numbers, null is null
+    """
+    if v is None: return "null"
+    if v.__class__ is str: return encode_basestring(v)
+    if v.__class__ is float: return repr(v) if math.isfinite(v) else "null"
+    if v.__class__ is int: return str(v)
+    return encode_basestring(str(v))
+
+"""The tables whose full scan is reported by :py:meth:`Dblink.query_plan`, the ones with most rows"""
+LARGE_TABLES = ("decay_radiations", "gammas", "levels")
+
+"""Default limits of the result cache, see :py:class:`Result_cache`: number of result sets, and of values over all of them"""
+CACHE_ENTRIES = 256
+CACHE_CELLS = 1000000
+
+def _params_key(params):
+    """The params of a query as a hashable value, for the result cache
+    """
+    if(isinstance(params, dict)):
+        return tuple(sorted(params.items()))
+    return tuple(params)
+
+# to name the in-memory copies of the database
+_memory_ids = itertools.count()
+
+"""Start of the names of the temporary tables of the keysets, see :py:class:`Keyset`"""
+KEYSET_PREFIX = "ndlab_keys_"
+
+# to name the keysets
+_keyset_ids = itertools.count()
+
+class Row:
+    """A row of a result set, whose values are accessed by column name
+
+    Plays the role of the json structure passed to the ndlab classes' _populate, without building it:
+    the column positions are taken once from the cursor description and shared by all the rows
+
+    Attributes:
+        _idx (dict): column name -> position in the row, shared among the rows of the same result set
+        _values (tuple): the values as returned by sqlite
+    """
+    __slots__ = ("_idx", "_values")
+
+    def __init__(self, idx, values):
+        self._idx = idx
+        self._values = values
+
+    def __getitem__(self, key):
+        return self._values[self._idx[key]]
+
+    def __contains__(self, key):
+        return key in self._idx
+
+    def get(self, key, default = None):
+        i = self._idx.get(key)
+        return default if i is None else self._values[i]
+
+    def keys(self):
+        return self._idx.keys()
+
+class Cached_result:
+    """A result set held in memory, read as a cursor
+
+    Each reader gets its own position over the shared rows
+
+    Attributes:
+        description (tuple): as the cursor's description
+    """
+
+    def __init__(self, description, rows):
+        self.description = description
+        self._rows = rows
+        self._pos = 0
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if(self._pos >= len(self._rows)):
+            raise StopIteration
+        self._pos += 1
+        return self._rows[self._pos - 1]
+
+    def fetchone(self):
+        return next(self, None)
+
+    def fetchmany(self, size = 1):
+        rows = self._rows[self._pos:self._pos + size]
+        self._pos += len(rows)
+        return rows
+
+    def fetchall(self):
+        return self.fetchmany(len(self._rows))
+
+class Chained_result(Cached_result):
+    """The rows already read from a cursor, then the cursor itself
+
+    Given back when a result set turns out too large for the cache
+    """
+
+    def __init__(self, cursor, rows):
+        super().__init__(cursor.description, rows)
+        self._cursor = cursor
+
+    def __next__(self):
+        if(self._pos < len(self._rows)):
+            self._pos += 1
+            return self._rows[self._pos - 1]
+        return next(self._cursor)
+
+    def fetchmany(self, size = 1):
+        rows = super().fetchmany(size)
+        if(len(rows) < size):
+            rows += self._cursor.fetchmany(size - len(rows))
+        return rows
+
+    def fetchall(self):
+        return super().fetchall() + self._cursor.fetchall()
+
+class Result_cache:
+    """Least recently used result sets, by sql and params
+
+    The database is reference data and does not change while open, so a result set can be given back
+    each time the same sql is executed, e.g. when walking decay chains or navigating related entities.
+    Only the statements returning rows are cached, a write through :py:meth:`Dblink.query_exec` empties the cache.
+    Bounded by the number of result sets and by the number of values (rows x columns) over all of them:
+    a result set larger than the whole budget is not cached. The streams (csv_stream, json_stream) bypass the cache
+
+    Attributes:
+        max_entries (int): maximum number of result sets
+        max_cells (int): maximum number of values
+        hits (int): results given from the cache
+        misses (int): results not found in the cache
+    """
+
+    def __init__(self, max_entries = CACHE_ENTRIES, max_cells = CACHE_CELLS):
+        self.max_entries = max_entries
+        self.max_cells = max_cells
+        self.hits = 0
+        self.misses = 0
+        self.cells = 0
+        self._results = collections.OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, sql):
+        """The cached result of the sql, or None
+
+        Args:
+            sql (Object): the sql, with its params if any, see :py:meth:`Dblink.query_exec`
+        """
+        with self._lock:
+            entry = self._results.get(sql)
+            if(entry == None):
+                self.misses += 1
+                return None
+            self._results.move_to_end(sql)
+            self.hits += 1
+        return Cached_result(entry[0], entry[1])
+
+    def put(self, sql, cursor):
+        """Reads the cursor and caches its rows
+
+        Returns:
+            Object: the result, to be read as the cursor
+        """
+        width = max(1, len(cursor.description) if cursor.description != None else 1)
+        rows = []
+        while True:
+            batch = cursor.fetchmany(CSV_BATCH)
+            rows += batch
+            if(len(rows) * width > self.max_cells):
+                return Chained_result(cursor, rows)
+            if(len(batch) < CSV_BATCH):
+                break
+
+        size = len(rows) * width
+        with self._lock:
+            if(sql not in self._results):
+                self._results[sql] = (cursor.description, rows, size)
+                self.cells += size
+                while(len(self._results) > self.max_entries or self.cells > self.max_cells):
+                    self.cells -= self._results.popitem(last = False)[1][2]
+        return Cached_result(cursor.description, rows)
+
+    def clear(self):
+        """Drops all the results and resets the counters
+        """
+        with self._lock:
+            self._results.clear()
+            self.cells = 0
+            self.hits = 0
+            self.misses = 0
+
+    def info(self):
+        """The counters of the cache
+
+        Returns:
+            dict: hits, misses, entries, cells, and the limits
+        """
+        with self._lock:
+            return {"hits" : self.hits, "misses" : self.misses, "entries" : len(self._results), "cells" : self.cells,
+                    "max_entries" : self.max_entries, "max_cells" : self.max_cells}
+
+class Keyset:
+    """A set of keys in a temporary table, to query the rows of many keys with one join instead of a query each
+
+    The table is on the connection checked out by the thread that loaded the keys, see :py:class:`Connection_pool`.
+    No other thread uses that connection while the thread holds it, so the table is seen only by the queries of that thread,
+    and lifting query_only to create or drop the table does not affect the others.
+    It is dropped by :py:meth:`drop`, at the end of a :code:`with` block, or when the connection is closed:
+    drop it before the thread ends or releases its connection, which then goes to another thread with the table
+
+    | with dblink.keyset(nucids) as ks:
+    |     rows = dblink.rows_build("DR_GAMMA", ks.filter("DR_GAMMA.PARENT_NUC_ID"))
+
+    Attributes:
+        name (str): the name of the temporary table
+        width (int): the number of values of each key
+        size (int): the number of distinct keys
+    """
+
+    def __init__(self, con, keys):
+        """
+        Args:
+            con (Connection): the connection to create the table on
+            keys (list): the keys, each a value or a tuple of values
+        """
+        keys = [key if isinstance(key, tuple) else (key,) for key in keys]
+        self.width = len(keys[0]) if len(keys) > 0 else 1
+        self.name = KEYSET_PREFIX + str(next(_keyset_ids))
+        self._con = con
+
+        columns = ", ".join(self._columns())
+        # the in-memory read-only databases are query_only, which forbids temporary tables as well
+        query_only = con.execute("pragma query_only").fetchone()[0]
+        try:
+            con.execute("pragma query_only = 0")
+            con.execute("create temp table " + self.name + " (" + columns + ", primary key (" + columns + ")) without rowid")
+            con.executemany("insert or ignore into temp." + self.name + " values (" + ", ".join(["?"] * self.width) + ")", keys)
+            con.commit()
+        finally:
+            con.execute("pragma query_only = " + str(query_only))
+        self.size = con.execute("select count(*) from temp." + self.name).fetchone()[0]
+
+    def _columns(self):
+        return ["k" + str(i) for i in range(self.width)]
+
+    def filter(self, *fields):
+        """The condition keeping the rows whose fields are one of the keys, to use in any filter
+
+        Args:
+            fields (str): the :py:mod:`ndlaborm` fields matching the values of each key, e.g. 'LEVEL.NUC_ID', 'LEVEL.SEQNO'
+
+        Returns:
+            str: the condition, e.g. "( LEVEL.NUC_ID , LEVEL.SEQNO ) in ( select k0 , k1 from temp.ndlab_keys_0 )"
+        """
+        if(len(fields) != self.width):
+            raise ValueError("the keys have " + str(self.width) + " values, " + str(len(fields)) + " fields given")
+        return ("( " + " , ".join(fields) + " )" if self.width > 1 else fields[0]) + \
+               " in ( select " + " , ".join(self._columns()) + " from temp." + self.name + " )"
+
+    def drop(self):
+        """Drops the temporary table
+        """
+        if(self._con == None): return
+        try:
+            query_only = self._con.execute("pragma query_only").fetchone()[0]
+            self._con.execute("pragma query_only = 0")
+            self._con.execute("drop table if exists temp." + self.name)
+            self._con.execute("pragma query_only = " + str(query_only))
+        except sqlite3.ProgrammingError:
+            # the connection has been closed, and the table with it
+            pass
+        self._con = None
+
+    def __len__(self):
+        return self.size
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, tb):
+        self.drop()
+        return False
+
+def _return_connection(pool_ref, con, generation):
+    """Gives a connection back to its pool, see :py:meth:`Connection_pool._give_back`. Dropped if the pool is gone, closed by sqlite when collected
+    """
+    pool = pool_ref()
+    if(pool != None):
+        pool._give_back(con, generation)
+
+class _Lease:
+    """The connection checked out by a thread, given back to its pool when the thread ends and the lease is collected
+
+    Attributes:
+        con (Connection): the connection
+        release (weakref.finalize): gives the connection back, once
+    """
+    __slots__ = ("__weakref__", "con", "release")
+
+    def __init__(self, pool, con, generation):
+        self.con = con
+        # a weak reference: the leases of the threads still alive do not keep the pool
+        self.release = weakref.finalize(self, _return_connection, weakref.ref(pool), con, generation)
+
+class Connection_pool:
+    """The connections to the database, opened when first needed and handed out per thread
+
+    A thread checks out a connection at its first query and uses it alone until it ends, or calls :py:meth:`release`:
+    the connection then goes back to the pool for the next thread. No two threads use the same connection at the same time,
+    more connections are opened when all the idle ones are taken, and at most size idle ones are kept open.
+    The result sets of a connection are to be read before its thread ends or releases it.
+    sqlite releases the GIL while executing a statement, so queries on different connections run in parallel.
+    Read-only connections are opened with the mode=ro and immutable=1 URI parameters: the database is reference data
+    and sqlite can skip the file locking
+
+    With in_memory, the database is copied at startup into a shared-cache in-memory database, 
+    and the connections are opened on the copy. The copy lives until the pool is closed and its connections are done.
+    The connections share one copy, and sqlite serializes the access to a shared cache:
+    the queries of several threads run one at a time, where on disk they run in parallel
+
+    Attributes:
+        db_path (str): path to the database
+        size (int): maximum number of idle connections kept open
+        read_only (bool): whether the connections are read-only
+        in_memory (bool): whether the connections are on an in-memory copy of the database
+        pragmas (dict): PRAGMA settings applied to each connection, see :py:func:`pragma_settings`
+    """
+
+    def __init__(self, db_path, size = POOL_SIZE, read_only = True, in_memory = False, pragmas = None):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self.read_only = read_only
+        self.in_memory = in_memory
+        self.pragmas = pragmas if pragmas != None else {}
+
+        # the connections not checked out, and the number of those opened
+        self._idle = []
+        self._opened = 0
+        # incremented when closing, so that the threads drop the connections they hold
+        self._generation = 0
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+        # the connection keeping the in-memory copy alive
+        self._memory = None
+        self._memory_uri = "file:ndlab_memory_" + str(next(_memory_ids)) + "?mode=memory&cache=shared"
+        if(in_memory):
+            self._load()
+
+    def _disk_uri(self):
+        uri = pathlib.Path(os.path.abspath(self.db_path)).as_uri()
+        return (uri + "?mode=ro&immutable=1") if self.read_only else uri
+
+    def _uri(self):
+        return self._memory_uri if self.in_memory else self._disk_uri()
+
+    def _load(self):
+        """Copies the database into memory with the sqlite backup API
+        """
+        self._memory = sqlite3.connect(self._memory_uri, uri = True, check_same_thread = False)
+        disk = sqlite3.connect(self._disk_uri(), uri = True)
+        try:
+            disk.backup(self._memory)
+        finally:
+            disk.close()
+
+    def _open(self):
+        if(self.in_memory and self._memory == None):
+            self._load()
+        con = sqlite3.connect(self._uri(), uri = True, check_same_thread = False)
+        for name, value in self.pragmas.items():
+            con.execute("pragma " + name + " = " + str(value))
+        if(self.in_memory and self.read_only):
+            # mode=ro does not apply to memory databases
+            con.execute("pragma query_only = 1")
+        return con
+
+    def connection(self):
+        """The connection checked out by the calling thread, an idle one or a new one at its first call
+
+        Returns:
+            Connection: the sqlite connection
+        """
+        held = getattr(self._local, "held", None)
+        if(held != None and held[0] == self._generation):
+            return held[1].con
+
+        with self._lock:
+            if(len(self._idle) > 0):
+                con = self._idle.pop()
+            else:
+                con = self._open()
+                self._opened += 1
+            generation = self._generation
+
+        # the thread-local values are collected when the thread ends
+        self._local.held = (generation, _Lease(self, con, generation))
+        return con
+
+    def _give_back(self, con, generation):
+        """Puts a connection back among the idle ones, or closes it when there are enough, 
+        or when the pool has been closed or drained since it was checked out
+        """
+        with self._lock:
+            current = generation == self._generation
+            if(current and len(self._idle) < self.size):
+                self._idle.append(con)
+                return
+            if(current):
+                self._opened -= 1
+        con.close()
+
+    def release(self):
+        """Gives back the connection of the calling thread, e.g. at the end of a task run by a thread pool.
+        The result sets still being read from it must be read first
+        """
+        held = getattr(self._local, "held", None)
+        self._local.held = None
+        if(held != None):
+            held[1].release()
+
+    def opened(self):
+        """Number of connections open, checked out or idle
+        """
+        return self._opened
+
+    def _retire(self):
+        """Stops handing out the connections open, and closes the idle ones
+
+        Returns:
+            _Lease: the lease of the calling thread, None if it holds no connection
+        """
+        with self._lock:
+            idle = self._idle
+            self._idle = []
+            self._opened = 0
+            self._generation += 1
+            memory = self._memory
+            self._memory = None
+        held = getattr(self._local, "held", None)
+        self._local.held = None
+
+        for con in idle:
+            con.close()
+        if(memory != None):
+            # the in-memory copy lives on while the connections checked out are open
+            memory.close()
+        return held[1] if held != None else None
+
+    def close(self):
+        """Closes the connections idle and the one of the calling thread, those of the other threads when they give them back.
+        New ones are opened at the next request
+        """
+        lease = self._retire()
+        if(lease != None):
+            lease.release()
+
+    def drain(self):
+        """Closes the connections idle, and the others when they are given back: the result sets being read, e.g. streams,
+        go on until their end, also those of the calling thread, whose connection is closed by sqlite once they are done.
+        For a pool replaced by another one
+        """
+        lease = self._retire()
+        if(lease != None):
+            # the calling thread may live on: dropped, not given back
+            lease.release.detach()
 
 class Dblink:
     
@@ -17,69 +535,289 @@ class Dblink:
     print_sql = True;
     print_debug = False;
 
-    def __init__(self, db_path = ''):
+    def __init__(self, db_path = '', pool_size = POOL_SIZE, read_only = True, in_memory = False, profile = "default", pragmas = None,
+                 cache = False, cache_entries = CACHE_ENTRIES, cache_cells = CACHE_CELLS, optimized = True):
+        """
+        Args:
+            db_path (str): path to the database
+            pool_size (int): maximum number of idle connections kept open, see :py:class:`Connection_pool`
+            read_only (bool): whether to open the database read-only
+            in_memory (bool): whether to load the whole database in memory at startup, and query the copy
+            profile (str): name of the PRAGMA profile applied to each connection, see :py:data:`PRAGMA_PROFILES`
+            pragmas (dict): PRAGMA settings overriding the profile ones
+            cache (bool): whether to keep the result sets in memory, see :py:class:`Result_cache`
+            cache_entries (int): maximum number of cached result sets
+            cache_cells (int): maximum number of cached values
+            optimized (bool): whether to open the optimized copy of the database when there is a current one, see :py:mod:`ndlaboptimizer`
+        """
         self._sqlbuilder = ndlaborm.Sqlbuilder()  
+        self.profile = profile
+        self._settings = pragma_settings(profile, pragmas)
+        self._pool_args = (pool_size, read_only, in_memory)
+        self._cache = Result_cache(cache_entries, cache_cells) if cache else None
+        self._optimized = optimized
+        self._pool = None
+        # table -> its columns, see table_columns
+        self._table_columns = {}
+
+        self.connect(db_path)
+        self.lastsql = ''
+
+    def connect(self, db_path):
+        """Opens another database, closing the current one
 
-        if(os.path.exists(db_path) ):
-            self._con_lite = sqlite3.connect(db_path)
+        The result cache is emptied. The file opened, in db_file, is the optimized copy of the database when there is a current one
+
+        Args:
+            db_path (str): path to the database
+        """
+        self.close()
+        self.cache_clear()
+        self._table_columns = {}
+        self.db_path = db_path
+        self.db_file = ndlaboptimizer.preferred_path(db_path) if self._optimized else db_path
+
+        if(os.path.exists(self.db_file) ):
+            self._pool = Connection_pool(self.db_file, *self._pool_args, self._settings)
             self.connected = True
         else:
-            self._con_lite = None
+            self._pool = None
             self.connected = False
             print("db path not found : " + os.path.abspath(os.path.join(db_path)))
 
-        self.lastsql = ''
+    @property
+    def _con_lite(self):
+        """The connection of the calling thread
+        """
+        return self._pool.connection() if self._pool != None else None
+
+    def release(self):
+        """Gives back the connection of the calling thread to the pool, see :py:meth:`Connection_pool.release`
+        """
+        if(self._pool != None):
+            self._pool.release()
+
+    def close(self):
+        """Closes the connections to the database
+        """
+        if(self._pool != None):
+            self._pool.close()
+
+    def load_in_memory(self):
+        """Switches to an in-memory copy of the database
+
+        The copy is made now, the following queries are served from memory.
+        Pays a one-time load cost for the lowest per-query latency, e.g. in long batch jobs.
+        The queries of the threads on the copy run one at a time, see :py:class:`Connection_pool`.
+        The result sets still being read, e.g. streams, go on from the database on disk, see :py:meth:`Connection_pool.drain`
+        """
+        if(self._pool == None or self._pool.in_memory):
+            return
+        pool = self._pool
+        self._pool = Connection_pool(pool.db_path, pool.size, pool.read_only, True, pool.pragmas)
+        self._pool_args = (pool.size, pool.read_only, True)
+        pool.drain()
+
+    def pragmas(self):
+        """The PRAGMA settings in effect on the connection of the calling thread
+
+        Reports the settings of all the profiles, as read back from sqlite
+
+        Returns:
+            dict: pragma name -> value
+        """
+        if(not self.connected): return {}
+
+        names = []
+        for settings in PRAGMA_PROFILES.values():
+            names += [name for name in settings if name not in names]
+        names += [name for name in self._pool.pragmas if name not in names]
+
+        con = self._con_lite
+        settings = {}
+        for name in names:
+            # no row when not applicable, e.g. mmap_size on a memory database
+            row = con.execute("pragma " + name).fetchone()
+            settings[name] = row[0] if row != None else None
+        return settings
+
+    def keyset(self, keys):
+        """Loads keys in a temporary table of the connection of the calling thread, see :py:class:`Keyset`
+
+        Args:
+            keys (list): the keys, each a value or a tuple of values
+
+        Returns:
+            Keyset: the keyset, None if the database is not local
+        """
+        if(not self.connected): return None
+        return Keyset(self._con_lite, keys)
+
+    def cache_info(self):
+        """The counters of the result cache, see :py:meth:`Result_cache.info`
+
+        Returns:
+            dict: the counters, None if the cache is off
+        """
+        return self._cache.info() if self._cache != None else None
+
+    def cache_clear(self):
+        """Empties the result cache
+        """
+        if(self._cache != None):
+            self._cache.clear()
     
 
     def force_clean_query(self,force):
-        """ Sets the flag for cleaning the query before parsing into the sql
+        """ Kept for compatibility: the query is always tokenized before parsing into the sql
 
         Just passing in to Sqlbilder
         """
         self._sqlbuilder.force_clean = force
 
-    def query_exec(self,sql):
+    def query_exec(self,sql, params = (), cached = True):
         """ Executes a sql query
 
-        Just avoiding talking directly with the db connection
+        Just avoiding talking directly with the db connection.
+        The same sql with different params is prepared once by sqlite, and kept in the connection's statement cache
+
+        Args:
+            sql (str): the query, with ? or :name placeholders for the params
+            params (Object): tuple with the values of the ? placeholders, or dict with those of the :name ones
+            cached (bool): False, the result is read from the cursor as it comes, bypassing the result cache, e.g. for the streams
         """
         if(self.print_debug):
-            print(sql)
+            print(sql, params)
+
+        # the keysets are changed and dropped by the users, their queries are not cached
+        if(self._cache == None or not cached or KEYSET_PREFIX in sql):
+            return self._con_lite.execute(sql, params)
 
-        return self._con_lite.execute(sql)
+        key = (sql, _params_key(params))
+        result = self._cache.get(key)
+        if(result == None):
+            cursor = self._con_lite.execute(sql, params)
+            if(cursor.description == None):
+                # no rows, a write: not cached, and the cached results may be outdated
+                self._cache.clear()
+                return cursor
+            result = self._cache.put(key, cursor)
+        return result
         
 
 
-    def _query_exec(self,fields, conditions=""):
-        """From users' parameters parses an sql query, and executes it
+    def table_columns(self, table):
+        """The columns of a table of the database, read once
+
+        Args:
+            table (str): the name of the table in the database, e.g. 'decay_radiations'
+
+        Returns:
+            list: the names of the columns, in their order
+        """
+        columns = self._table_columns.get(table)
+        if(columns == None):
+            columns = [row[1] for row in self._con_lite.execute("pragma table_info(" + table + ")")]
+            self._table_columns[table] = columns
+        return columns
+
+    def _query_exec(self,fields, conditions="", params = (), columns = None, cached = True):
+        """From users' parameters parses an sql query, and executes it with the params
+
+        Args:
+            columns (list): when fields is 'TABLE.*', the only columns of the table to select, see :py:func:`ndlaborm.project`
+            cached (bool): whether the result may come from, or go into, the result cache, see :py:meth:`query_exec`
         """
        
+        sql = ""
         try:
-            return self.query_exec(self.query_build(fields, conditions))
+            sql = self.query_build(fields, conditions)
+            if(columns != None):
+                sql = ndlaborm.project(sql, columns)
+                self.lastsql = sql
+        except ValueError as er:
+            # e.g. tables that cannot be joined, refused before running a cartesian product
+            print('"Error, check the rules for the fields and filter parameters\n": %s' % er)
+            return None
         except:
-            try:
-             if(not self._sqlbuilder.force_clean):
-                self.force_clean_query(True)
-                sql = self.query_build(fields, conditions)
-                self.force_clean_query(False)
-                try:
-                    return self.query_exec(sql)
-                except sqlite3.Error as er:
-                    exc_msg = (' '.join(er.args))
-                    if(not self.print_sql):
-                        exc_msg = ""
-
-                    print('"Error, check the rules for the fields and filter parameters\n": %s' % exc_msg)
-                    if(self.print_sql):
-                        print(sql)
-                    #print("Exception class is: ", er.__class__)
-                    #print('SQLite traceback: ')
-                    #exc_type, exc_value, exc_tb = sys.exc_info()
-                    #print(traceback.format_exception(exc_type, exc_value, exc_tb))
-            except:
-                return None
-            return None 
+            return None
+        return self._sql_exec(sql, params, cached)
+
+    def _sql_exec(self, sql, params = (), cached = True):
+        """Executes an sql already built, printing the error if any
+
+        Returns:
+            Object: the cursor, None if the execution failed
+        """
+        try:
+            return self.query_exec(sql, params, cached)
+        except sqlite3.Error as er:
+            exc_msg = (' '.join(er.args))
+            if(not self.print_sql):
+                exc_msg = ""
+
+            print('"Error, check the rules for the fields and filter parameters\n": %s' % exc_msg)
+            if(self.print_sql):
+                print(sql, params)
+            #print("Exception class is: ", er.__class__)
+            #print('SQLite traceback: ')
+            #exc_type, exc_value, exc_tb = sys.exc_info()
+            #print(traceback.format_exception(exc_type, exc_value, exc_tb))
+        except:
+            return None
+        return None 
             
+    def query_plan(self, fields, conditions="", params = ()):
+        """How sqlite runs a query, from EXPLAIN QUERY PLAN, with the likely causes of slowness
+
+        Args:
+            fields (str): the fields of the query
+            conditions (str): the conditions of the query
+            params (Object): the values of the placeholders in conditions, see :py:meth:`query_exec`
+
+        Returns:
+            dict: "sql" the query. 
+            "plan" the steps, each a dict with id, parent and detail as given by sqlite. 
+            "full_scans" the steps reading a whole table among :py:data:`LARGE_TABLES`, as dict with table, alias and detail. 
+            "unindexed_joins" the joined tables with no index starting with one of the columns looked up by the join, as dict with table, alias and columns. 
+            None if the query is not valid, or the database is not local
+        """
+        if(not self.connected): return None
+
+        try:
+            sql = self.query_build(fields, conditions)
+            joins = self._sqlbuilder.join_plan(self._sqlbuilder.parse(fields), self._sqlbuilder.parse(conditions))
+            con = self._con_lite
+            steps = con.execute("explain query plan " + sql, params).fetchall()
+        except (ValueError, sqlite3.Error) as er:
+            print('"Error, check the rules for the fields and filter parameters\n": %s' % er)
+            return None
+
+        links = joins["links"]
+        # alias -> table, the tables not aliased being their own alias
+        tables = {alias : table for table, alias, columns in links}
+        for table in joins["tables"][:1]:
+            tables[table] = table
+
+        plan = []
+        full_scans = []
+        for step in steps:
+            plan.append({"id" : step[0], "parent" : step[1], "detail" : step[-1]})
+            words = step[-1].split(" ")
+            # e.g. 'SCAN gammas', 'SCAN gam_lev_e USING INDEX idx_levels_energy', 'SCAN TABLE gammas AS g' in older sqlite
+            if(words[0] != "SCAN" or len(words) < 2): continue
+            alias = words[words.index("AS") + 1] if "AS" in words else words[2 if words[1] == "TABLE" else 1]
+            table = tables.get(alias, alias)
+            if(table in LARGE_TABLES):
+                full_scans.append({"table" : table, "alias" : alias, "detail" : step[-1]})
+
+        unindexed = []
+        for table, alias, columns in links:
+            if(not any([index[0] in columns for index in ndlaboptimizer._indexes(con, table)])):
+                unindexed.append({"table" : table, "alias" : alias, "columns" : columns})
+
+        return {"sql" : sql, "plan" : plan, "full_scans" : full_scans, "unindexed_joins" : unindexed}
+
     def query_desc(self,fields, conditions=""):
         """ Tries to describe a query 
 
@@ -104,28 +842,84 @@ class Dblink:
      
     def query_build(self,fields, conditions=""):
         """Produces an sql from users' parameters
+
+        Placeholders are kept in the sql, the same fields and conditions give the same sql whatever the params
         
         interface to sqlbuilder
         """
         self.lastsql = self._sqlbuilder.query_build(fields,conditions)
         return self.lastsql
 
+    def bind(self, conditions, params = ()):
+        """The conditions with the values of the params inlined, for when they can not be bound
+
+        interface to sqlbuilder
+        """
+        return self._sqlbuilder.bind(conditions, params)
+
     def _result_keys(self, result):
         """The keys of a result set
         """
         return [key[0] for key in result.description]
        
 
-    def json_build(self, tablename , filter = ''):
+    def rows_build(self, tablename , filter = '', params = (), columns = None):
+        """Users' interface to get the rows of a query, with values accessed by column name
+
+        Args:
+            columns (list): when tablename is 'TABLE.*', the only columns of the table to select
+        """
+        return self._rows_build(self._query_exec(tablename, filter, params, columns))
+
+    def rows_exec(self, sql, params = ()):
+        """The rows of an sql already built, e.g. a compiled :py:class:`ndlaborm.Relation`
+
+        Args:
+            sql (str): the sql, as given by :py:meth:`query_build`
+            params (Object): the values of the placeholders in the sql, see :py:meth:`query_exec`
+        """
+        return self._rows_build(self._sql_exec(sql, params))
+
+    def tuples_build(self, tablename, filter = '', params = (), columns = None):
+        """The names of the columns and all the rows of a query, as tuples of values, e.g. to build a :py:class:`ndlabframe.Frame`
+
+        Args:
+            columns (list): when tablename is 'TABLE.*', the only columns of the table to select
+
+        Returns:
+            tuple: (keys, rows), None if the query fails
+        """
+        result = self._query_exec(tablename, filter, params, columns)
+        if(result == None): return None
+        return self._result_keys(result), result.fetchall()
+
+    def _rows_build(self, result):
+        """From a result set builds the rows, without any conversion of the values
+        """
+
+        if(not result): return result
+
+        idx = {key : i for i, key in enumerate(self._result_keys(result))}
+
+        return (Row(idx, r) for r in result)
+
+    def json_build(self, tablename , filter = '', typed = False, params = ()):
         """Users interface to get the data in json
+
+        Args:
+            typed (bool): False, all the values are strings ('None' for null). True, numbers and nulls are kept
+            params (Object): the values of the placeholders in filter, see :py:meth:`query_exec`
         """
-        return self._json_build(self._query_exec(tablename , filter ))
+        return self._json_build(self._query_exec(tablename , filter, params ), typed)
               
-    def _json_build(self, result):
+    def _json_build(self, result, typed = False):
         """From a result set builds the json
         """
        
         if(not result): return result
+
+        if(typed):
+            return "[" + ",".join(self._json_objects(result)) + "]"
         
         keys = self._result_keys(result)
 
@@ -141,37 +935,124 @@ class Dblink:
 
         return "[" + ",".join(jss) + "]"       
 
-    def csv_build(self,tablename , filter = ''):
+    def _json_objects(self, result):
+        """From a result set yields the typed json object of each row
+
+        The key of each column, with its separator, is encoded once per result set
+        """
+        keys = self._result_keys(result)
+        prefixes = [("{" if i == 0 else ",") + encode_basestring(k) + ":" for i, k in enumerate(keys)]
+        columns = list(zip(range(len(keys)), prefixes))
+
+        for r in result:
+            yield "".join([prefix + _json_value(r[i]) for i, prefix in columns]) + "}"
+
+    def json_stream(self, tablename, filter = '', batch_size = CSV_BATCH, params = ()):
+        """Users' interface to get the data in NDJSON, one typed json object per line, chunk by chunk
+
+        Returns:
+            generator: the chunks, each with the lines of batch_size rows, or None if the query fails
+        """
+        # read as it comes: the result cache would load it whole first
+        result = self._query_exec(tablename, filter, params, cached = False)
+        if(not result): return result
+
+        return self._json_stream(result, batch_size)
+
+    def _json_stream(self, result, batch_size = CSV_BATCH):
+        """From a result set yields the NDJSON, one chunk every batch_size rows
+        """
+        lines = []
+        for obj in self._json_objects(result):
+            lines.append(obj)
+            if(len(lines) == batch_size):
+                yield "\n".join(lines) + "\n"
+                lines = []
+        if(len(lines) > 0):
+            yield "\n".join(lines) + "\n"
+
+    def data_stream(self, return_type, fields, condition, batch_size = CSV_BATCH, params = ()):
+        """Users' interface to get the data in csv or NDJSON, chunk by chunk
+
+        Returns:
+            generator: the chunks, or None if the query fails
+        """
+        if(return_type == 'ndjson'):
+            return self.json_stream(fields, condition, batch_size, params)
+        return self.csv_stream(fields, condition, batch_size, params = params)
+
+    def csv_build(self,tablename , filter = '', params = ()):
         """Users' interface to get the data in csv
         """
-        return self._csv_build(self._query_exec(tablename, filter))
+        return self._csv_build(self._query_exec(tablename, filter, params))
 
     def _csv_build(self, result, sep=","):
         """From a result set builds the csv
         """
        
         if(not result): return result
-       
-        keys = self._result_keys(result)
-        jss = [sep.join(keys)]   
-        i_range = range(len(keys))
-        for r in result:
-            jss.append(sep.join(( str(r[i]) if  str(r[i]) != 'None' else '')for i in i_range) )    
               
-        return  "\n".join(jss)     
+        return  "".join(self._csv_stream(result, sep))     
+
+    def csv_stream(self, tablename, filter = '', batch_size = CSV_BATCH, sep=",", params = ()):
+        """Users' interface to get the data in csv, chunk by chunk
+
+        Returns:
+            generator: the chunks of the csv, or None if the query fails
+        """
+        # read as it comes: the result cache would load it whole first
+        result = self._query_exec(tablename, filter, params, cached = False)
+        if(not result): return result
+
+        return self._csv_stream(result, sep, batch_size)
+
+    def _csv_stream(self, result, sep=",", batch_size = CSV_BATCH):
+        """From a result set yields the csv: first the header, then one chunk every batch_size rows
+
+        Only one batch is in memory at a time. The chunks joined give the whole csv
+        """
+        keys = self._result_keys(result)
+        yield sep.join(keys)
 
-    def data_deliverer(self, return_type, fields, condition):
+        while True:
+            rows = result.fetchmany(batch_size)
+            if(not rows): break
+            yield "\n" + "\n".join(sep.join(('' if v is None else str(v)) for v in r) for r in rows)
+
+    def csv_write(self, out, tablename, filter = '', batch_size = CSV_BATCH, sep=",", params = ()):
+        """Writes the csv of a query into a file-like object, chunk by chunk
+
+        Returns:
+            bool: False if the query fails
+        """
+        chunks = self.csv_stream(tablename, filter, batch_size, sep, params)
+        if(chunks == None): return False
+
+        for chunk in chunks:
+            out.write(chunk)
+        return True
+
+    def data_deliverer(self, return_type, fields, condition, params = ()):
         """Users' interface to get the data in json or csv
+
+        Args:
+            return_type (str): 'csv', 'json' with all values as strings, 'json_typed' with numbers and nulls, or 'ndjson'
+            params (Object): the values of the placeholders in condition, see :py:meth:`query_exec`
         """
         res = "res"
         if(return_type == 'csv'):
-            res = self.csv_build(fields, condition)
+            res = self.csv_build(fields, condition, params)
             if(res == None):
                 return 'message \n error in the query'
-        if( return_type == 'json'):
-            res = self.json_build(fields, condition)
+        if( return_type == 'json' or return_type == 'json_typed'):
+            res = self.json_build(fields, condition, return_type == 'json_typed', params)
             if(res == None):
                 return '{"message":"error in the query"}'
+        if( return_type == 'ndjson'):
+            res = self.json_stream(fields, condition, params = params)
+            if(res == None):
+                return '{"message":"error in the query"}\n'
+            res = "".join(res)
         return res
 
 
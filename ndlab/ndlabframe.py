@@ -0,0 +1,140 @@
+"""
+Query results as columns of NumPy arrays instead of lists of ndlab instances, see :py:func:`ndlab.frame`.
+
+NumPy is needed only by the frames, and is imported when the first one is built
+"""
+
+"""Suffix of the column with the uncertainty of a quantity, e.g. energy -> energy_unc"""
+UNC_SUFFIX = "_unc"
+
+"""Code of a null in the columns of strings"""
+NULL_CODE = -1
+
+def _numpy():
+    """The numpy module, imported at the first use
+    """
+    import numpy
+    return numpy
+
+def _float(val):
+    """A value as float, None if it is not a number
+    """
+    if val is None or val.__class__ is float:
+        return val
+    try:
+        return float(val)
+    except:
+        return None
+
+class Frame:
+    """The columns of a query result, each a NumPy array
+
+    | f = frame("DR_GAMMA", "DR_GAMMA.PARENT_NUC_ID = '135XE'")
+    | en = f["energy"] * f["intensity"] / 100
+    | f[f["energy"] > 500].decode("multipolarity")
+
+    * the columns of numbers are arrays of int64, or of float64 when they have nulls, given as nan
+    * the quantities, the columns having an uncertainty column (e.g. energy and energy_unc), are arrays of float64.
+      :py:meth:`unc` gives the uncertainty, 0 when null as in :py:class:`ndlab.Quantity`
+    * the columns of strings are categorical: int32 codes, :py:data:`NULL_CODE` for null, indexing :py:meth:`labels`
+
+    Indexing with a mask or with an array of positions gives the frame of the selected rows
+
+    :ivar list quantities: the names of the quantities
+    """
+
+    def __init__(self, keys, rows):
+        """
+        Args:
+            keys (list): the names of the columns
+            rows (list): the rows, tuples of values in the order of keys
+        """
+        np = _numpy()
+        keys = list(keys)
+        values = list(zip(*rows)) if len(rows) > 0 else [()] * len(keys)
+
+        self._size = len(rows)
+        self._columns = {}
+        self._labels = {}
+        self.quantities = [key for key in keys if key + UNC_SUFFIX in keys]
+
+        for key, column in zip(keys, values):
+            if(key in self.quantities):
+                self._columns[key] = self._floats(np, column, np.nan)
+            elif(key.endswith(UNC_SUFFIX) and key[:-len(UNC_SUFFIX)] in self.quantities):
+                self._columns[key] = self._floats(np, column, 0.0)
+            else:
+                self._columns[key] = self._array(np, key, column)
+
+    def _floats(self, np, column, null):
+        """An array of float64, null for the values not numbers
+        """
+        return np.fromiter((null if v is None else v for v in map(_float, column)), np.float64, len(column))
+
+    def _array(self, np, key, column):
+        """The array of a column, with the type of its values
+        """
+        kinds = set([v.__class__ for v in column])
+        nulls = type(None) in kinds
+        kinds.discard(type(None))
+
+        if(kinds <= set([int]) and not nulls and len(kinds) > 0):
+            return np.fromiter(column, np.int64, len(column))
+        if(kinds <= set([int, float]) and (len(kinds) > 0 or nulls)):
+            return self._floats(np, column, np.nan)
+
+        # strings, categorical
+        index = {}
+        codes = np.fromiter((NULL_CODE if v is None else index.setdefault(v, len(index)) for v in column), np.int32, len(column))
+        self._labels[key] = list(index)
+        return codes
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, key):
+        return key in self._columns
+
+    def __getitem__(self, key):
+        if(key.__class__ is str):
+            return self._columns[key]
+
+        # the rows selected by a mask or by positions
+        frame = Frame.__new__(Frame)
+        frame._columns = {name : column[key] for name, column in self._columns.items()}
+        frame._labels = self._labels
+        frame.quantities = self.quantities
+        frame._size = len(next(iter(frame._columns.values()))) if len(frame._columns) > 0 else 0
+        return frame
+
+    def keys(self):
+        """The names of the columns
+        """
+        return self._columns.keys()
+
+    def unc(self, key):
+        """The uncertainty of a quantity
+
+        Args:
+            key (str): the name of the quantity, e.g. 'energy'
+        """
+        return self._columns[key + UNC_SUFFIX]
+
+    def labels(self, key):
+        """The strings of a categorical column, in the order of their codes. None if the column is not categorical
+        """
+        return self._labels.get(key)
+
+    def decode(self, key):
+        """The strings of a categorical column, as an array of objects with None for null
+        """
+        np = _numpy()
+        labels = np.array(self._labels[key] + [None], dtype = object)
+        # NULL_CODE picks the None appended
+        return labels[self._columns[key]]
+
+    @property
+    def nbytes(self):
+        """The memory taken by the arrays
+        """
+        return sum([column.nbytes for column in self._columns.values()])
@@ -0,0 +1,174 @@
+"""
+Builds an optimized copy of the database: the indexes matching the queries of :py:mod:`ndlaborm`, and the statistics of the query planner
+"""
+
+import json
+import os
+import pathlib
+import re
+import sqlite3
+import sys
+import time
+
+import ndlaborm
+
+"""Name of the table recording how an optimized database was built, and from which file"""
+MANIFEST_TABLE = "ndlab_optimizer"
+
+"""Added to the name of the database to name its optimized copy, e.g. ndlab_db.s3db -> ndlab_db.optimized.s3db"""
+OPTIMIZED_SUFFIX = ".optimized"
+
+def optimized_path(db_path):
+    """The default path of the optimized copy of a database
+    """
+    root, ext = os.path.splitext(db_path)
+    return root + OPTIMIZED_SUFFIX + ext
+
+def _key_order(columns):
+    """The columns of a key, nuclides first: the indexes then serve also the queries on the nuclide only
+    """
+    return tuple(sorted(columns, key = lambda c: not c.endswith("nucid")))
+
+def index_specs():
+    """The indexes needed by the queries of :py:mod:`ndlaborm`, from its foreign keys
+
+    * for each foreign key, its columns in the table having it, e.g. gammas (nucid, l_seqno) for GAMMA.START_LEVEL
+    * for the tables with a decay mode, the key of the parent level followed by the mode, e.g. decay_radiations (parent_nucid, parent_l_seqno, decay_code),
+      the key of the radiations of a decay
+    * for the tables shared by several classes, the columns telling them apart, e.g. decay_radiations (type_a, type_b) for DR_X
+
+    Returns:
+        list: (table, columns) pairs, without doublers
+    """
+    specs = []
+    for owner, target, pairs, name in ndlaborm._LINKS:
+        specs.append((owner, _key_order([local for local, remote in pairs])))
+
+    for name, cls in ndlaborm._TABLES.items():
+        if("table" not in cls.data): continue
+        table = cls.data["table"]
+        mode = getattr(cls, "MODE", None)
+        level = getattr(cls, "PARENT_LEVEL", getattr(cls, "LEVEL", None))
+        if(mode != None and level != None and "fk" in level.data):
+            specs.append((table, _key_order([pair[0] for pair in ndlaborm._pairs(level)]) + (mode.data["column"],)))
+        if("where" in cls.data):
+            specs.append((table, tuple(ndlaborm._unique(re.findall(r"(\w+)\s*=", cls.data["where"])))))
+
+    return ndlaborm._unique(specs)
+
+def _indexes(con, table):
+    """The columns of each index of a table
+
+    Returns:
+        list: for each index, the tuple of its columns in order
+    """
+    indexes = []
+    for index in con.execute("pragma index_list(" + table + ")").fetchall():
+        info = con.execute("pragma index_info(" + index[1] + ")").fetchall()
+        indexes.append(tuple([column[2] for column in sorted(info)]))
+    return indexes
+
+def _source_stat(db_path):
+    """The size and modification time of a database, to tell whether its optimized copy is outdated
+    """
+    stat = os.stat(db_path)
+    return {"source_size" : str(stat.st_size), "source_mtime" : str(int(stat.st_mtime))}
+
+def optimize(db_path, out_path = None, verbose = False):
+    """Writes the optimized copy of a database
+
+    The database is copied, the indexes of :py:func:`index_specs` not already covered by an index are created,
+    then the copy is analyzed and vacuumed. A manifest table records the source file, so that :py:func:`preferred_path` can
+    tell whether the copy is still current. The copy is written aside and moved in place at the end
+
+    Args:
+        db_path (str): path to the database
+        out_path (str): path of the copy, :py:func:`optimized_path` if not given
+        verbose (bool): whether to print the indexes created
+
+    Returns:
+        str: the path of the copy
+    """
+    out_path = optimized_path(db_path) if out_path == None else out_path
+    tmp_path = out_path + ".tmp"
+    if(os.path.exists(tmp_path)):
+        os.remove(tmp_path)
+
+    source = sqlite3.connect(db_path)
+    con = sqlite3.connect(tmp_path)
+    try:
+        source.backup(con)
+
+        tables = [row[0] for row in con.execute("select name from sqlite_master where type = 'table'")]
+        created = []
+        for table, columns in index_specs():
+            if(table not in tables): continue
+            # the data model may name columns not in this release of the database
+            if(not set(columns) <= set([row[1] for row in con.execute("pragma table_info(" + table + ")")])): continue
+            # an index starting with the columns serves as well
+            if(any([index[:len(columns)] == columns for index in _indexes(con, table)])): continue
+            name = "idx_opt_" + table + "_" + "_".join(columns)
+            con.execute("create index " + name + " on " + table + " (" + ", ".join(columns) + ")")
+            created.append(name)
+            if(verbose): print("created " + name)
+
+        con.execute("analyze")
+
+        manifest = _source_stat(db_path)
+        manifest["source_path"] = os.path.abspath(db_path)
+        manifest["created"] = time.strftime("%Y-%m-%d %H:%M:%S")
+        manifest["indexes"] = json.dumps(created)
+        con.execute("drop table if exists " + MANIFEST_TABLE)
+        con.execute("create table " + MANIFEST_TABLE + " (key text primary key, value text)")
+        con.executemany("insert into " + MANIFEST_TABLE + " values (?, ?)", manifest.items())
+        con.commit()
+
+        con.execute("vacuum")
+    finally:
+        source.close()
+        con.close()
+
+    os.replace(tmp_path, out_path)
+    return out_path
+
+def manifest(db_path):
+    """The manifest of an optimized database
+
+    Returns:
+        dict: key -> value, None if the database is not an optimized copy
+    """
+    if(not os.path.exists(db_path)): return None
+    uri = pathlib.Path(os.path.abspath(db_path)).as_uri() + "?mode=ro"
+    con = sqlite3.connect(uri, uri = True)
+    try:
+        return dict(con.execute("select key, value from " + MANIFEST_TABLE).fetchall())
+    except sqlite3.Error:
+        return None
+    finally:
+        con.close()
+
+def is_current(db_path, out_path = None):
+    """Whether the optimized copy of a database exists and was built from the database as it is now
+
+    Args:
+        db_path (str): path to the database
+        out_path (str): path of the copy, :py:func:`optimized_path` if not given
+    """
+    out_path = optimized_path(db_path) if out_path == None else out_path
+    info = manifest(out_path)
+    if(info == None or not os.path.exists(db_path)): return False
+    stat = _source_stat(db_path)
+    return all([info.get(key) == value for key, value in stat.items()])
+
+def preferred_path(db_path):
+    """The file to open for a database: its optimized copy when current, otherwise the database itself
+    """
+    optimized = optimized_path(db_path)
+    return optimized if is_current(db_path, optimized) else db_path
+
+if __name__ == "__main__":
+    # python ndlaboptimizer.py ndlab_db.s3db [out_path]
+    if(len(sys.argv) < 2):
+        print("usage: python ndlaboptimizer.py db_path [out_path]")
+        sys.exit(1)
+    print(optimize(sys.argv[1], sys.argv[2] if len(sys.argv) > 2 else None, True))
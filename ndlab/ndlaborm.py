@@ -4,46 +4,53 @@ Defines the grammar to query the database, and its translation into sql
 
 #%config IPCompleter.greedy = True
 
+import collections
 import json
 import inspect,sys
 import re
+import threading
 from operator import truediv
 
+# the tokens of users' parameters, in order of precedence. Blanks only separate tokens
+_TOKEN = re.compile(r"""
+      '(?:[^']|'')*'?                           # quoted string, '' being an escaped quote
+    | "(?:[^"]|"")*"?
+    | (?:\d+\.?\d*|\.\d+)(?:[eE][+-]?\d+)?        # number
+    | [A-Za-z_]\w*(?:\.(?:[A-Za-z_]\w*|\*))*       # name or dotted path, e.g. GAMMA.START_LEVEL.ENERGY or NUCLIDE.*
+    | :[A-Za-z_]\w*                              # named placeholder
+    | <=|>=|<>|!=|==|\|\|                         # two-character operators
+    | \S                                         # anything else, one character at a time
+""", re.VERBOSE)
+
+def _literal(value):
+    """The sql literal of a value, strings quoted
+    """
+    if(value is None): return "null"
+    if(isinstance(value, str)): return "'" + value.replace("'", "''") + "'"
+    return str(int(value) if isinstance(value, bool) else value)
+
 class Sqlbuilder:
     """Parses a string with nuclear data model tokens
 
      Attributes:
-        force_clean (bool):  whether fields and conditions of the query will be "cleaned", e.g. (NUCLIDE.Z -> ( NUCLIDE.Z. 
-        When false, the cleaning is done only if the query execution raises an exception
+        force_clean (bool): kept for compatibility. The parameters are always split into tokens, see :py:meth:`tokenize`
 
-        _classes (Object[]): the classes of this module, used in clean_token() to find their place in a string
+        compile_cache_size (int): how many compiled queries are kept, see :py:meth:`compiled`. 0 to turn the cache off
     """
 
-# if fields and conditions of the query will be "cleaned", e.g. (NUCLIDE.Z -> ( NUCLIDE.Z
-# when false, the cleaning is done only if the query execution raises an exception
+# no longer used: the parameters are always tokenized
     force_clean = False
 
-# the classes of this module, used in clean_token to find where are placed in a string     
-    _classes = []
-# characters in the query that need to have a space before and after
-    _to_clean_both = ", ) / % =".split(" ") 
+# the compiled queries, shared by all the builders: (fields, conditions) -> {"errors":[...], "sql":"..."}
+    compile_cache_size = 1024
+    _compiled = collections.OrderedDict()
+    _compiled_lock = threading.Lock()
 
-    _to_clean_right = ".ALL ) ] }".split(" ")
-    _to_clean_left = "( [ {".split(" ")
-
-# a string token is evaluated to convert it into an object
-# then it will be checked if it is an orm piece
+# a string token is looked up in the symbol table to convert it into an object
+# then it will be checked if it is an orm piece. Nothing is evaluated
     def interrogate(self,tk):
-        try:
-            ret = eval(tk)
-            #  '241AM' : when the string is between ''
-            if ret.__class__.__name__ == "str":
-                return tk
-            else:
-                # this is a string without ''
-                return ret
-        except:
-            return eval("tk")
+        pieces = _SYMBOLS.get(tk)
+        return pieces[0] if pieces != None else tk
 
 # checks if an object is a class of this module
     def is_datamodel(self,piece):
@@ -51,163 +58,95 @@ class Sqlbuilder:
             return True
         return False 
 
-    # fills the _classes list
-    def get_classes(self):
-        # lazy
-        if(len(self._classes) > 0 ): return self._classes
+    def tokenize(self, string):
+        """Splits users' parameters into tokens, in one pass
 
-        for name, obj in inspect.getmembers(sys.modules["ndlaborm"]):
-            if inspect.isclass(obj):
-                self._classes.append(obj)
-                #print('print(description(' + name + '))')
-        return self._classes  
-
-    # attributes of a class
-    def get_attributes(self,cls):
-        attr = []
-        dump = dir(type('dump', (object,), {}))
-
-        for item in inspect.getmembers(cls):
-            if(item[0] not in dump and item[0] != 'ALL'):
-                attr.append(item[0])
-        return attr  
-
-    # adds blanks where needed: '(GAMMA.ENERGY=' -->  '( GAMMA.ENERGY ='
-    def before_after_class(self,tk, idx, mclass):
+        Operators, parentheses, quoted strings, numbers and dotted paths are tokens whether blanks separate them or not:
+        '(GAMMA.ENERGY>100)' gives ['(', 'GAMMA.ENERGY', '>', '100', ')']. TABLE.* becomes TABLE.ALL
+
+        Args:
+            string (str): fields or conditions
+
+        Returns:
+            list: the tokens
         """
+        return [tk[:-1] + "ALL" if tk.endswith(".*") else tk for tk in _TOKEN.findall(string)]
+
+    def bind(self, string, params = ()):
+        """The conditions with the values of params in place of the placeholders
 
-        tk the token
-        idx the starting of the class name within the token
-        mclass the class found in this token
+        For when the query can not be executed with the params, e.g. when sent to a remote server
+
+        Args:
+            string (str): the conditions, with ? or :name placeholders
+            params (Object): tuple with the values of the ? placeholders, or dict with those of the :name ones
+
+        Returns:
+            str: the conditions with the values
         """
-        length = len(mclass.__name__)
-        char_before = tk[idx-1: idx]
-    
-        if(idx > 0 and char_before != '.' and char_before != '_'): #  before: cases like "(GAMMA.ENERGY ..."
-            tk =  tk[:idx] + ' ' + tk[idx:]
-            length = length + 1
-
-        # after the class there is "." and the fields   
-        tks = tk.split(".") 
-        # only the last sub-token.
-        # for "GAMMA.END_LEVEL.JP" the last token is not a field of the GAMMA class  
-        # and will go unchecked now. It will be picked up when clean_tk finds END_LEVEL and passes it back here
-        last_tk = tks[len(tks)-1] 
-        attribs = self.get_attributes(mclass) 
-        idx_max = 0
-        len_max = 0
-        # check all the possible fields, take the longest name to avoid errors in cases like "J" and "JP"
-        for attr in attribs:
-            idx = last_tk.find(attr)
-          
-            if(idx == -1): continue
-            char_after = "" if len(last_tk) == len(attr) else last_tk[idx + len(attr): idx+ len(attr)+1]
-         
-            
-            # this is a bit ad hoc, it is to deal with :
-            # 1 - NUCLIDE.NUC_ID , where also N is a field of nuclide
-            # 2 - LEVEL.NUC.NUC_ID where NUC is a class and needs to be separated from NUC_ID
-            if(char_after == "_" or  ( attr != last_tk and last_tk.startswith('NUC_ID') and  attr != 'NUC_ID'  )): continue
-
-            mlen = len(attr)
-            len_max =  mlen if mlen > len_max else len_max
-            idx_max = idx if mlen > len_max else idx_max
-        
-        if(len_max > 0 and len(last_tk) > len_max):
-            last_tk =   last_tk[:idx_max + len_max]  + ' ' + last_tk[idx_max + len_max:]
-        tks[len(tks)-1] = last_tk
-       
-        return ".".join(tks)
-                
-  
-    # take one token (string with no blanks), look for classes and process the token
-    def clean_tk(self,tk):
-        
-        for ch in self._to_clean_both:
-            tk = tk.replace(ch, ' ' + ch + ' ')
+        if(not params): return string
 
-        for ch in self._to_clean_right: 
-            tk = tk.replace(ch, ch + ' ')
-    
-        for ch in self._to_clean_left: 
-            tk = tk.replace(ch, ' ' + ch )
-        
-        #remove multiple blanks
-        tk = re.sub(r"\s+", " ", tk)  
-
-        classes = self.get_classes()
-        for mclass in classes:
-            idx = tk.find(mclass.__name__,0)
-            while(idx != -1):
-                idx = tk.find(mclass.__name__,idx) #the token contains a class name
-                if(idx > -1):   
-                    len_bef = len(tk)   
-                    tk = self.before_after_class(tk,idx, mclass) # place blanks if needed
-                    len_aft = len(tk)
-                    idx = idx + len_aft - len_bef + 1
-
-        return tk
+        values = None if isinstance(params, dict) else iter(params)
+        tks = self.tokenize(string)
+        for i, tk in enumerate(tks):
+            try:
+                if(tk == "?" and values != None):
+                    tks[i] = _literal(next(values))
+                elif(tk.startswith(":") and values == None):
+                    tks[i] = _literal(params[tk[1:]])
+            except (StopIteration, KeyError):
+                raise ValueError("no value for the placeholder " + tk + " at token " + str(i + 1) + " of " + string)
+        return " ".join(tks)
 
     def clean_query(self,str):
-        tks_a = str.split()
-        # put blanks where needed: 'GAMMA.ENERGY=' -->  'GAMMA.ENERGY ='
-        clean_string = ''
-        for tk_a in tks_a:
-            clean_string += ' ' + self.clean_tk(tk_a)
-
-        return clean_string
-        #tks_a = clean_string.split()
+        """The parameters with exactly one blank between tokens, see :py:meth:`tokenize`
+        """
+        return " ".join(self.tokenize(str))
 
     def is_constant(self, const_name):
-        for name, obj in inspect.getmembers(sys.modules["ndlaborm"]):
-             if(name == str(const_name)) : 
-                return [True, obj]
+        if(const_name in _CONSTANTS):
+            return [True, _CONSTANTS[const_name]]
         return [False,const_name]
 
 
-    #string should have datamodel tokens separated by ' '
+    # string is tokenized, unless it is already a list of tokens
     def parse(self,string):
-    # string should be like '( Gamma.start_level.energy - Gamma.end_level.energy ) = 100'
+    # string like '(Gamma.start_level.energy - Gamma.end_level.energy) = 100'
       
         fields = []
         tables = []
-        fks = []
+        joins = [] # (table, joined table, column pairs, desc) of each fk followed
+        discriminators = [] # the "where" of the tables sharing a db table, e.g. DR_ALPHA
         tables_nofks = [] # "true" tables, not from a fk addition
         errors = []
-        # table.* will be prefixed with DISTINCT
-        if(string.endswith(".*")):
-            string = string.replace(".*",".ALL")
-
-        tks_a = string.split() # datamodel must have blank spaces. Use clean_query to pre-process
+        tks_a = self.tokenize(string) if string.__class__ is str else string
        
         for tk_a in tks_a:
             try:
                 # check what kind of staff is tk_a
-                piece = (self.interrogate(tk_a))
+                # from GAMMA.START_LEVEL.ENERGY  the array [GAMMA.START_LEVEL.ENERGY, GAMMA.START_LEVEL, GAMMA]
+                tks_c = _SYMBOLS.get(tk_a)
                 # if it is one of the constants, like DELAY_N
-                dummy = self.is_constant(str(tk_a)) 
+                dummy = self.is_constant(tk_a) 
                 if(dummy[0]):
                     if(dummy[1].__class__.__name__ == "str"):
                         # string, add quotes
                         dummy[1] = "'" + dummy[1] + "'" 
                     fields.append(str(dummy[1])) # str in case is an integer
 
-                elif not self.is_datamodel(piece):
-                      # it is not part of the datamodel: leave as it is.
-                      # dont use 'piece', it can be the description of a built in function or object
-                    fields.append(str(tk_a)) #fields.append(str(piece))
+                elif tks_c == None:
+                    # it is not part of the datamodel: leave as it is.
+                    tks_b = tk_a.split(".")
+                    if(tks_b[0] in _TABLES):
+                        # but it looks like it should be, e.g. GAMMA.Z
+                        if(len(tks_b) > 3):
+                            errors.append('"token_counts":"' +str(len(tks_b))+'"')
+                            break
+                        errors.append('"token_unknown":"' + tk_a + '"')
+                    fields.append(tk_a)
                   
                 else:  # it is data model
-                    tks_b = tk_a.split(".")
-                    tot = len(tks_b)
-                    if(tot > 3):
-                        errors.append('"token_counts":"' +str(tot)+'"')
-                        break
-                    # from GAMMA.START_LEVEL.ENERGY  build the array [GAMMA.START_LEVEL.ENERGY, GAMMA.START_LEVEL, GAMMA]
-                    tks_c = []
-                    for i in range(0, tot):
-                        dm = ".".join(tks_b[0:tot -i])
-                        tks_c.append(eval(dm))
+                    tot = len(tks_c)
                     # process the pieces, so far only 3 levels are dealt with. Remeber: the pieces go backward
                     for i in range(0, tot):
                         
@@ -221,8 +160,7 @@ class Sqlbuilder:
                             if 'table' not in tk.data: # this is fk
                                 tblnm = self.table_name(tk) 
                                 tables.append(tblnm)
-                                for col in tk.data["fk"]["column"]:
-                                    fks.append( tks_c[i+1].data["table"] + "." + col)
+                                joins.append((tks_c[i+1].data["table"], tblnm, _pairs(tk), tk.data.get("desc", "")))
                                 tblnm = tk.data["fk"]["alias"] if "alias" in tk.data["fk"].keys() else  tk.data["fk"]["table"]
                                 fields.append(tblnm + "." + column)
                             else: # this is a table
@@ -234,13 +172,13 @@ class Sqlbuilder:
                                 tables.append(tk.data["table"])
                                 tables_nofks.append(tk.data["table"])
                                 if 'where' in tk.data:
-                                    fks.append(tk.data["where"])
+                                    discriminators.append(tk.data["where"])
 
                         if( i == 2  ): # it is a table
                             tables.append(tk.data["table"])
                             tables_nofks.append(tk.data["table"])
                             if 'where' in tk.data:
-                                fks.append(tk.data["where"])
+                                discriminators.append(tk.data["where"])
                         
 
 
@@ -249,35 +187,70 @@ class Sqlbuilder:
                 errors.append('"error_generic":"' +(msg)+'"')
                 
 
-        tables = list(set(tables))
+        tables = _unique(tables)
 
-        #print("tables " + str(tables) + " fks " +str(fks)+ " fields " +str(fields) + " tables_nofks " + str(tables_nofks) + " errors " + str(errors) )
-
-        return {"tables":tables, "fks":fks, "fields":fields, "tables_nofks" : tables_nofks , "errors" : errors}
+        return {"tables":tables, "joins":joins, "discriminators":discriminators, "fields":fields, "tables_nofks" : tables_nofks , "errors" : errors}
 
     def table_name(self, tk):    
         """ Table name for a foreign key
         """
         return tk.data["fk"]["table"] + (( " as " + tk.data["fk"]["alias"]) if "alias" in tk.data["fk"].keys() else "")
 
+    def compiled(self, fields, conditions, what, compile):
+        """The compiled query, from the cache or by calling compile
+
+        Each (fields, conditions) is parsed once: its errors and its sql are kept, 
+        the least recently used are dropped beyond compile_cache_size
+
+        Args:
+            fields (str): the fields of the query
+            conditions (str): the conditions of the query
+            what (str): "errors" or "sql"
+            compile (function): produces what is asked when not in the cache
+
+        Returns:
+            Object: the errors list or the sql
+        """
+        if(self.compile_cache_size <= 0):
+            return compile(fields, conditions)
+
+        key = (fields, conditions)
+        with self._compiled_lock:
+            entry = self._compiled.get(key)
+            if(entry != None):
+                self._compiled.move_to_end(key)
+                if(what in entry):
+                    return entry[what]
+
+        value = compile(fields, conditions)
+
+        with self._compiled_lock:
+            entry = self._compiled.setdefault(key, {})
+            entry[what] = value
+            while(len(self._compiled) > self.compile_cache_size):
+                self._compiled.popitem(last = False)
+        return value
+
+    def compile_cache_clear(self):
+        """Empties the cache of the compiled queries
+        """
+        with self._compiled_lock:
+            self._compiled.clear()
+
 # add error when no table is found (error in building the token): GAMMA.Z
     def query_check(self,fields, conditions=""):  
         """Parse the parameters and report the errors
         """
+        # a copy, the caller may add to it
+        return list(self.compiled(fields, conditions, "errors", self._query_check))
 
-        _fields = self.clean_query(fields)
-        _conditions = self.clean_query(conditions)
-        
-        select = self.parse(_fields)
-        where = self.parse(_conditions)
+    def _query_check(self,fields, conditions=""):  
+        select = self.parse(fields)
+        where = self.parse(conditions)
 
         errors = select["errors"] + where["errors"]
-        tables = select["tables_nofks"] + where["tables_nofks"]
-        tables = list(set(tables))
-       
-        if(len(tables) > 1): 
-            errors.append('"table_counts":"' +str(len(tables))+'"')        
-       
+        errors += self.join_plan(select, where)["errors"]
+
         return errors
     
     def is_query_ok(self,fields, conditions=""):  
@@ -289,126 +262,195 @@ class Sqlbuilder:
         return True
 
     def query_desc(self,fields, conditions=""):
-        if(self.force_clean ):
-            fields = self.clean_query(fields)
-            conditions = self.clean_query(conditions)
-
+        """The description of the joins of a query, one per line
+        """
         select = self.parse(fields)
         where = self.parse(conditions)
-        tables = select["tables"] + where["tables"]
-        fks = select["fks"] + where["fks"]
-
-        desc = self.foreign_keys(tables, fks)["desc"]
-        return "\n".join(desc)
-
-
-    def foreign_keys(self, tables, fks):
-        desc = []
-
-        return { "fks":fks, "desc":desc} 
-
-        # force fk for queries on multiple tables. In case of multiple insertions, the doublers are removed below  
-        #  PARENT_LEVEL = LEVEL('{"column" : "parent_l_seqno", "fk": {"table" : "levels", "alias" : "levels_s" , "column" : ["parent_l_seqno = levels_s.l_seqno", "parent_nucid = levels_s.nucid"]}}')
-        if LEVEL.data["table"] in tables and NUCLIDE.data["table"] in tables:
-                fks.append("nuclides.nucid = levels.nucid")
-                desc.append(" nuclide having the level")
-
-# think more about
-        if (self.table_name(DR_GAMMA.END_LEVEL))  in tables and NUCLIDE.data["table"] in tables:    
-                fks.append("gammas.nucid = "+ DR_GAMMA.END_LEVEL.data["fk"]["alias"] + ".nucid")
-               
-# this is ambiguous, it could link to the daughter        
-        if DR_GAMMA.data["table"] in tables and NUCLIDE.data["table"] in tables:
-            fks.append("nuclides.nucid = dr_gammas.parent_nucid")
-            desc.append(" the parent of the nuclide emitting the radiation")
-
-
-        if GAMMA.data["table"] in tables and NUCLIDE.data["table"] in tables:
-            print("found")
-            fks.append("nuclides.nucid = gammas.nucid")
-            desc.append(" nuclide having the gamma transition")
-
-        if GAMMA.data["table"] in tables and LEVEL.data["table"] in tables:
-            fks.append("levels.nucid = gammas.nucid")
-            fks.append("levels.l_seqno = gammas.l_seqno")
-            desc.append(" level emitting the gamma")
-
-
-# consider whether to add the level
-        if GAMMA.data["table"] in tables and L_DECAY.data["table"] in tables:
-            fks.append("l_decays.nucid = gammas.nucid")
-            desc.append(" parent nuclide having the gamma")
-
-            #fks.append("l_decays.l_seqno = gammas.l_seqno")
-
-        if GAMMA.data["table"] in tables and _DECAY_RADIATION.data["table"] in tables:
-            fks.append("decay_radiations.daughter_nucid = gammas.nucid")
-            fks.append("decay_radiations.adopted_daughter_l_seqno = gammas.l_seqno")
-            desc.append(" daughter having the gamma ")
 
-        # link to parent or daughter ?
-        # if L_DECAY.data["table"] in tables and NUCLIDE.data["table"] in tables:
-        #     fks.append("nuclides.nucid = l_decays.nucid")
-        #     desc.append(" parent nuclide of the decay")
+        return "\n".join(self.join_plan(select, where)["desc"])
 
-        # link to parent or daughter ?
-        # if L_DECAY.data["table"] in tables and LEVEL.data["table"] in tables:
-        #     fks.append("levels.nucid = l_decays.nucid")
-        #     fks.append("levels.l_seqno = l_decays.l_seqno")
-        #     desc.append(" parent level of the decay")
+    def join_plan(self, select, where):
+        """How the tables of a query are joined
 
+        The tables written by the user are joined through the only foreign key linking each of them 
+        to the tables before, the foreign keys in the paths (e.g. GAMMA.START_LEVEL.ENERGY) to the table they start from.
+        Tables with no foreign key to the others, or with more than one, would give a cartesian product and are reported as errors
 
-        # in the dr there are two possible reference : parent or daughter
-        # if DECAY_RAD.data["table"] in tables and NUCLIDE.data["table"] in tables:
-        #     fks.append("nuclides.nucid = decay_radiations.parent_nucid")
-        #     desc.append(" parent nuclide of the decay")
-            
-
-        if CUM_FY.data["table"] in tables and DR_GAMMA.data["table"] in tables:
-            fks.append("cum_fy.daughter_nucid = dr_gammas.parent_nucid")
-            desc.append(" product nuclide whose decay daughter emits the gamma")
-
-        return { "fks":fks, "desc":desc} 
+        Args:
+            select (dict): the parsed fields, see :py:meth:`parse`
+            where (dict): the parsed conditions
 
+        Returns:
+            dict: "from" the from clause, "conditions" the conditions to add to the where, 
+            "desc" the description of each join, "errors" the tables that could not be joined,
+            "links" the (table, alias, columns) of each joined table, the columns being those looked up by the join,
+            "tables" the tables written by the user
+        """
+        tables = _unique(select["tables_nofks"] + where["tables_nofks"])
+        joins = _unique(select["joins"] + where["joins"])
+        conditions = _unique(select["discriminators"] + where["discriminators"])
+        errors = []
+        desc = []
+        links_used = []
+
+        clause = tables[0] if len(tables) > 0 else ""
+        joined = tables[:1]
+        pending = tables[1:]
+        while(len(pending) > 0):
+            table = None
+            for tbl in pending:
+                links = [link for link in _LINKS if (link[0] == tbl and link[1] in joined) or (link[1] == tbl and link[0] in joined)]
+                if(len(links) > 0):
+                    table = tbl
+                    break
+            if(table == None):
+                errors.append('"tables_unconnected":"' + ",".join(pending) + '"')
+                break
+
+            pending.remove(table)
+            joined.append(table)
+            if(len(links) > 1):
+                errors.append('"join_ambiguous":"' + table + ' by ' + " or ".join([link[3] for link in links]) + '"')
+                continue
+
+            owner, target, pairs, name = links[0]
+            clause += " join " + table + " on " + _on(owner, target, pairs)
+            desc.append(table + " joined by " + name)
+            links_used.append((table, table, [pair[0 if owner == table else 1] for pair in pairs]))
+
+        for owner, tblnm, pairs, dsc in joins:
+            clause += " join " + tblnm + " on " + _on(owner, tblnm.split(" ")[-1], pairs)
+            desc.append(tblnm + ": " + dsc.strip())
+            links_used.append((tblnm.split(" ")[0], tblnm.split(" ")[-1], [pair[1] for pair in pairs]))
+
+        return {"from" : clause, "conditions" : conditions, "desc" : desc, "errors" : errors, "links" : links_used, "tables" : tables}
 
 #query_build -> parse
 
     def query_build(self,fields, conditions=""):
-         
-        if(self.force_clean ): # place spaces around orm tokens
-            fields = self.clean_query(fields)
-            conditions = self.clean_query(conditions)
- 
+        """The sql of the parameters, see :py:meth:`compiled`
+        """
+        return self.compiled(fields, conditions, "sql", self._query_build)
+
+    def _query_build(self,fields, conditions=""):
         select = self.parse(fields)
         fields_str = " ".join(select["fields"])
         where = self.parse(conditions)
   
-        tables = select["tables"] + where["tables"]
-        fks = select["fks"] + where["fks"]
-
-        fks = self.foreign_keys(tables, fks)["fks"]
-
-        tables = list(set(tables)) # remove doublers
-        tables_str = ",".join(tables)
-
-        fks = list(set(fks))
-        fks_str = " and ".join(fks)
-
-        where_str =  " ".join(where["fields"])
-
-        if ( len(where_str) > 0 and len(fks_str) > 0 ):
-            where_str = fks_str + " and " + where_str
-        elif (len(fks_str) > 0):
-            where_str = fks_str
+        plan = self.join_plan(select, where)
+        if(len(plan["errors"]) > 0):
+            raise ValueError("the tables of the query cannot be joined: " + ", ".join(plan["errors"]))
+        tables_str = plan["from"]
+
+        rewritten = self.rewrite(select, where, plan)
+        if(rewritten != None):
+            distinct, where_str = rewritten
+        else:
+            distinct = True
+            fks_str = " and ".join(plan["conditions"])
+            where_str =  " ".join(where["fields"])
+
+            if ( len(where_str) > 0 and len(fks_str) > 0 ):
+                where_str = fks_str + " and " + where_str
+            elif (len(fks_str) > 0):
+                where_str = fks_str
 
         where_str = where_str.strip();
-        if ( (not any([where_str.startswith(s) for s in ["order","group","having"]]) ) and (len(where_str) > 0 )) :
+        if ( (not any([where_str.lower().startswith(s) for s in ["order","group","having","limit"]]) ) and (len(where_str) > 0 )) :
             where_str = "where " + where_str
 
-        qry =  "select distinct " + fields_str + " from " + tables_str + " " + where_str
+        qry =  "select " + ("distinct " if distinct else "") + fields_str + " from " + tables_str + " " + where_str
 
         return qry
 
+    def rewrite(self, select, where, plan):
+        """Simplifies the where of a query, and tells whether the rows need DISTINCT
+
+        * the conditions are split at the top level ANDs, the repeated ones are dropped, e.g. the same fk written twice.
+          Those with a placeholder are kept, their values may differ. A group of conditions with a top level OR
+          is kept whole, within parentheses
+        * the ORDER BY clauses are merged into one at the end, e.g. from a user's filter joined with the filter of a link, 
+          and the items repeated, or fixed by an equality condition, are dropped. An equality fixes a column only 
+          when the where has no top level OR
+        * DISTINCT is not needed when the selected fields include the key (see the "key" of the tables' data) of each table
+          whose rows are not looked up by key. The tables joined by their key, like the fk aliases, do not add rows.
+          Without DISTINCT sqlite can also read the rows in the order of an index instead of sorting them
+
+        Args:
+            select (dict): the parsed fields, see :py:meth:`parse`
+            where (dict): the parsed conditions
+            plan (dict): the joins, see :py:meth:`join_plan`
+
+        Returns:
+            tuple: (whether to use DISTINCT, the where clause without "where"). None when the conditions have 
+            GROUP BY, HAVING, a compound select, or a placeholder in ORDER BY, and are left as they are
+
+        Examples:
+            >>> builder = Sqlbuilder()
+            >>> builder.query_build("LEVEL.NUC_ID", "LEVEL.NUC_ID='135XE' and LEVEL.SEQNO=2 or LEVEL.ENERGY>100 and LEVEL.NUC_ID='135XE'")
+            "select distinct levels.nucid from levels where ( levels.nucid = '135XE' and levels.l_seqno = 2 or levels.energy > 100 and levels.nucid = '135XE' )"
+            >>> builder.query_build("DR_BETAM.ENERGY", "DR_BETAM.ENERGY > 100 or DR_BETAM.INTENSITY > 5")
+            "select distinct decay_radiations.energy from decay_radiations where type_a='B-' and ( decay_radiations.energy > 100 or decay_radiations.intensity > 5 )"
+            >>> builder.query_build("LEVEL.ENERGY", "LEVEL.SEQNO = 0 and LEVEL.NUC_ID='135XE' or LEVEL.NUC_ID='136XE' and LEVEL.ENERGY < 3000 order by LEVEL.SEQNO")
+            "select distinct levels.energy from levels where ( levels.l_seqno = 0 and levels.nucid = '135XE' or levels.nucid = '136XE' and levels.energy < 3000 ) ORDER BY levels.l_seqno"
+        """
+        split = _split_where(where["fields"])
+        if(split == None): return None
+        groups, orders, rest = split
+
+        # the conditions of the plan, then those of the user
+        pieces = [[c] for c in plan["conditions"]]
+        chain = True
+        for group in groups:
+            if(any([tk.lower() == "or" for tk in _top_level(group)])):
+                # the ANDs and ORs of a group stay among themselves, apart from the conditions joined to it
+                pieces.append(["("] + group + [")"])
+                chain = False
+            else:
+                pieces += _split_top(group, "and")
+
+        conditions = []
+        for piece in pieces:
+            text = " ".join(piece)
+            if(text == "" or (text in conditions and not _has_placeholder(piece))): continue
+            conditions.append(text)
+
+        # the columns set to a value are the same in all rows: no need to order by them. Not so within an OR
+        fixed = [piece[0] for piece in pieces if len(piece) == 3 and piece[1] in ("=", "==")] if chain else []
+        items = []
+        for item in _split_top([tk for order in orders for tk in order + [","]], ","):
+            text = " ".join(item)
+            if(text == "" or text in items or (len(item) == 1 and item[0] in fixed)): continue
+            items.append(text)
+
+        where_str = " and ".join(conditions)
+        if(len(items) > 0):
+            where_str += " ORDER BY " + " , ".join(items)
+        if(len(rest) > 0):
+            where_str += " " + " ".join(rest)
+
+        return (not self._unique_rows(select, plan), where_str)
+
+    def _unique_rows(self, select, plan):
+        """Whether the rows of a query are unique without DISTINCT, see :py:meth:`rewrite`
+        """
+        if(len(plan["tables"]) == 0): return False
+        fields = set(select["fields"])
+
+        # the tables that can give more than one row each: the first, and those not joined by their key
+        adding = [(plan["tables"][0], plan["tables"][0])]
+        for table, alias, columns in plan["links"]:
+            key = _KEYS.get(table)
+            if(key == None or not set(key) <= set(columns)):
+                adding.append((table, alias))
+
+        for table, alias in adding:
+            key = _KEYS.get(table)
+            if(key == None): return False
+            if((alias + ".*") not in fields and not all([(alias + "." + column) in fields for column in key])):
+                return False
+        return True
+
 def description(obj):
          #classfact =  getattr(sys.modules[__name__], name)
          #obj = classfact()
@@ -528,7 +570,7 @@ class Column(_Base):
 
 class NUCLIDE(_Base):
     desc =  "properties of the nuclide in its ground state"
-    data = json.loads('{"table" : "nuclides"}')
+    data = json.loads('{"table" : "nuclides", "key" : ["nucid"]}')
     Z = Column('z','number of protons')
     N = Column('n', 'number of neutrons')
     NUC_ID = Column('nucid', _STR + 'identifier, e.g. 135XE') 
@@ -579,7 +621,7 @@ class NUCLIDE(_Base):
 
 class LEVEL(_Base):
     desc =  "properties of the energy states of a nuclide"
-    data = json.loads('{"table" : "levels"}')
+    data = json.loads('{"table" : "levels", "key" : ["nucid", "l_seqno"]}')
     NUC = NUCLIDE('{ "column" : "nucid", "fk": {"table" : "nuclides", "alias" : "lev_nuc" , "column" : ["nucid = lev_nuc.nucid"]}, "desc" : "' + _LNK + '  access to the properties of the nuclide , e.g. LEVEL.NUC.Z  "}')
     SEQNO = Column('l_seqno','sequential number of the level, G.S. = 0')
     ENERGY = Column('energy',_QTT + 'level energy [keV]')
@@ -624,7 +666,7 @@ class DECAY_MODE(_Base):
 # extend to add the decay decode, decay group
 class L_DECAY(_Base):
     desc = "properties of a decay mode of a level"
-    data = json.loads('{"table" : "l_decays"}')
+    data = json.loads('{"table" : "l_decays", "key" : ["nucid", "l_seqno", "decay_code", "daughter_nucid"]}')
     NUC = NUCLIDE('{ "column" : "nucid", "fk": {"table" : "nuclides", "alias": "dec_p_nuc" , "column" : ["nucid = dec_p_nuc.nucid"]},  "desc" :  "' + _LNK + ' access to parent nuclide properties , e.g. L_DECAY.NUC.Z  "}')
     LEVEL = LEVEL('{"column" : "l_seqno", "fk": {"table" : "levels", "alias": "dec_p_lev" ,"column" : ["l_seqno = dec_p_lev.l_seqno", "nucid = dec_p_lev.nucid"]} , "desc" :  "' + _LNK + ' access to the properties of the level, e.g. L_DECAY.LEVEL.ENERGY  "}')
     MODE = Column('decay_code','code of the decay, specify it  using one of the DECAY_* constants')
@@ -678,7 +720,7 @@ class _GM(_Base):
 
 class GAMMA(_GM):
     desc =  "properties of a nuclide electromagnetic transition"
-    data = json.loads('{"table" : "gammas"}')
+    data = json.loads('{"table" : "gammas", "key" : ["nucid", "l_seqno", "g_seqno"]}')
 
     NUC = NUCLIDE( '{"column" : "nucid", "fk":{"table" : "nuclides", "alias" : "gam_nuc"    , "column" : ["nucid=gam_nuc.nucid"]}, "desc" : "* Link - access to the properties of the nuclide, e.g. GAMMA.NUC.Z  "}')
     NUC_ID = Column('nucid')
@@ -709,7 +751,7 @@ class DECAY_RAD(_Base):
 
 class _FY(_Base):
     
-    data = json.loads('{"table" : "cum_fy"}')
+    data = json.loads('{"table" : "cum_fy", "key" : ["parent_nucid", "daughter_nucid", "l_seqno"]}')
 
     THER_YIELD = Column('ther_yield', _QTTL + 'thermal neutron yield')
     THER_YIELD_UNC = Column('ther_yield_unc')
@@ -734,7 +776,7 @@ class CUM_FY(_FY):
 
 class IND_FY(_FY):
     desc =  "independent fission yields"
-    data = json.loads('{"table" : "ind_fy"}')
+    data = json.loads('{"table" : "ind_fy", "key" : ["parent_nucid", "daughter_nucid", "l_seqno"]}')
     PARENT = NUCLIDE( '{"column" : "parent_nucid", "fk":{"table" : "nuclides", "alias" : "ify_nuc_p", "column" : ["parent_nucid=ify_nuc_p.nucid"]}, "desc" :  "' + _LNK + ' access to the properties of the fissioning nuclide, e.g. IND_FY.PARENT.Z  "}')
     PRODUCT = NUCLIDE( '{"column" : "daughter_nucid", "fk":{"table" : "nuclides", "alias" : "ify_nuc_d","column" : ["daughter_nucid=ify_nuc_d.nucid"]}, "desc" :  "' + _LNK + ' access to the properties of the product nuclide, e.g. IND_FY.PRODUCT.Z  "}')
     PARENT_LEVEL = LEVEL('{"column" : "l_seqno", "fk": {"table" : "levels", "alias" : "ify_lev_p" , "column" : ["parent_l_seqno = ify_lev_p.l_seqno", "parent_nucid = ify_lev_p.nucid"]}, "desc" :  "' + _LNK + ' access to the properties of the parent level, e.g. IND_FY.PARENT_LEVEL.ENERGY  "}')
@@ -838,7 +880,7 @@ class DR_DELAYED(DECAY_RAD):
 
 class DR_PHOTON_TOTAL(_Base):
     desc =  "photon decay radiation (regardless whether gamma or X, and summed on all the branching modes)"
-    data = json.loads('{"table" : "dr_photon_totals"}')
+    data = json.loads('{"table" : "dr_photon_totals", "key" : ["parent_nucid", "parent_l_seqno", "energy"]}')
                                                                                                                                                                                   
     PARENT = NUCLIDE( '{"column" : "parent_nucid", "fk":{"table" : "nuclides","alias" : "pt_nuc_p" ,  "column" : ["parent_nucid=pt_nuc_p.nucid"]},"desc": "' + _LNK + ' access to the properties of the parent nuclide, e.g. DR_*.PARENT.Z  "}')
     PARENT_LEVEL = LEVEL('{"column" : "parent_l_seqno", "fk": {"table" : "levels", "alias" : "pt_lev_p" , "column" : ["parent_l_seqno = pt_lev_p.l_seqno", "parent_nucid = pt_lev_p.nucid"]}, "desc" :  "' + _LNK + ' access to the properties of the parent level, e.g. DR_*.PARENT_LEVEL.ENERGY  "}')
@@ -860,7 +902,8 @@ class DR_PHOTON_TOTAL(_Base):
 
 class DR_GAMMA(_GM):
     desc =  "gamma decay radiation"
-    data = json.loads('{"table" : "dr_gammas"}')
+    # dr_gammas is a view, with no constraint: the key is assumed, the decay key plus the gamma key, and decides whether DISTINCT is dropped
+    data = json.loads('{"table" : "dr_gammas", "key" : ["parent_nucid", "parent_l_seqno", "decay_code", "nucid", "l_seqno", "g_seqno"]}')
 
 
     PARENT = NUCLIDE( '{"column" : "parent_nucid", "fk":{"table" : "nuclides","alias" : "drg_nuc_p" ,  "column" : ["parent_nucid=drg_nuc_p.nucid"]} ,"desc": "' + _LNK + ' access to the properties of the parent nuclide, e.g. DR_GAMMA.PARENT.Z  "}')
@@ -1057,6 +1100,266 @@ SHELL_N = 'N'
 SHELL_NPLUS = 'N+'
 SHELL_O = 'O'
 
+def _paths(path, piece, pieces, symbols):
+    """Adds to symbols the path of a data model piece, and those of its attributes, up to 3 levels
+    """
+    pieces = (piece,) + pieces
+    if(len(pieces) > 1):
+        symbols[path] = pieces
+    if(len(pieces) == 3 or piece is _Base.ALL or piece.__class__ is Column):
+        return
+
+    cls = piece if inspect.isclass(piece) else piece.__class__
+    for name in dir(cls):
+        attr = getattr(cls, name)
+        if(name == "ALL" or (not name.startswith("_") and isinstance(attr, _Base))):
+            _paths(path + "." + name, attr, pieces, symbols)
+
+def _symbol_table():
+    """The tokens users can write, resolved once
+
+    Returns:
+        dict: path -> the pieces from the field back to the table, e.g. 
+        'GAMMA.START_LEVEL.ENERGY' -> (LEVEL.ENERGY, GAMMA.START_LEVEL, GAMMA)
+        dict: table name -> class, e.g. 'GAMMA' -> GAMMA
+        dict: constant name -> value, e.g. 'DECAY_Bm' -> 2
+    """
+    symbols = {}
+    tables = {}
+    constants = {}
+    for name, obj in vars(sys.modules[__name__]).items():
+        if(name.startswith("_")): continue
+        if(inspect.isclass(obj) and issubclass(obj, _Base) and obj is not Column):
+            tables[name] = obj
+            _paths(name, obj, (), symbols)
+        elif(obj.__class__ is int or obj.__class__ is str):
+            constants[name] = obj
+    return symbols, tables, constants
+
+_SYMBOLS, _TABLES, _CONSTANTS = _symbol_table()
+
+def _unique(items):
+    """The items without doublers, in their order
+    """
+    return list(dict.fromkeys(items))
+
+def _top_level(tokens):
+    """The tokens not within parentheses or a CASE
+    """
+    depth = 0
+    for tk in tokens:
+        low = tk.lower()
+        if(tk == ")" or low == "end"): depth -= 1
+        if(depth == 0): yield tk
+        if(tk == "(" or low == "case"): depth += 1
+
+def _split_top(tokens, separator):
+    """The tokens split at the separator, when not within parentheses, a CASE, or a BETWEEN ... AND
+    """
+    pieces = [[]]
+    depth = 0
+    between = False
+    for tk in tokens:
+        low = tk.lower()
+        if(tk == ")" or low == "end"): depth -= 1
+        if(depth == 0 and low == "between"): between = True
+        if(depth == 0 and low == separator):
+            if(between and separator == "and"):
+                between = False
+            else:
+                pieces.append([])
+                continue
+        pieces[-1].append(tk)
+        if(tk == "(" or low == "case"): depth += 1
+    return [piece for piece in pieces if len(piece) > 0]
+
+def _has_placeholder(tokens):
+    return any([tk == "?" or tk.startswith(":") for tk in tokens])
+
+def _split_where(tokens):
+    """The conditions, the ORDER BY clauses, and the rest (LIMIT ...) of the tokens of a where
+
+    Returns:
+        tuple: (the groups of conditions, separated by the ORDER BY, the items of each ORDER BY, the tokens from LIMIT on).
+        None with GROUP BY, HAVING, a compound select, or a placeholder in an ORDER BY
+    """
+    groups = [[]]
+    orders = []
+    rest = []
+    state = "where"
+    depth = 0
+    i = 0
+    while(i < len(tokens)):
+        tk = tokens[i]
+        low = tk.lower()
+        if(tk == ")" or low == "end"): depth -= 1
+        if(depth == 0 and state != "rest"):
+            if(low in ("group", "having", "union", "except", "intersect", "window")):
+                return None
+            if(low == "order" and i + 1 < len(tokens) and tokens[i + 1].lower() == "by"):
+                state = "order"
+                orders.append([])
+                i += 2
+                continue
+            if(low == "limit"):
+                state = "rest"
+            elif(low == "and" and state == "order"):
+                # conditions after an ORDER BY, e.g. the filter of a link joined to the user's one
+                state = "where"
+                groups.append([])
+                i += 1
+                continue
+        if(state == "where"): groups[-1].append(tk)
+        elif(state == "order"): orders[-1].append(tk)
+        else: rest.append(tk)
+        if(tk == "(" or low == "case"): depth += 1
+        i += 1
+
+    if(any([_has_placeholder(order) for order in orders])): return None
+    return [group for group in groups if len(group) > 0], orders, rest
+
+def _pairs(fk):
+    """The (local, remote) columns of a foreign key, e.g. GAMMA.START_LEVEL -> (('l_seqno', 'l_seqno'), ('nucid', 'nucid'))
+    """
+    pairs = []
+    for pair in fk.data["fk"]["column"]:
+        local, remote = [c.strip() for c in pair.split("=")]
+        pairs.append((local, remote.split(".")[-1]))
+    return tuple(pairs)
+
+def _on(owner, target, pairs):
+    """The join condition of a foreign key from the table owner to the table (or alias) target
+    """
+    return " and ".join([owner + "." + local + " = " + target + "." + remote for local, remote in pairs])
+
+def _links():
+    """The foreign keys between db tables, as (table, linked table, column pairs, name), e.g.
+    ('gammas', 'levels', (('l_seqno', 'l_seqno'), ('nucid', 'nucid')), 'GAMMA.START_LEVEL')
+    """
+    links = {}
+    for name, cls in _TABLES.items():
+        if("table" not in cls.data): continue
+        for attr_name in dir(cls):
+            attr = getattr(cls, attr_name)
+            if(not isinstance(attr, _Base) or "fk" not in attr.data): continue
+            key = (cls.data["table"], attr.data["fk"]["table"], _pairs(attr))
+            if(key[0] != key[1] and key not in links):
+                links[key] = name + "." + attr_name
+    return [key + (name,) for key, name in links.items()]
+
+_LINKS = _links()
+
+"""The columns identifying the rows of each db table, from the "key" of the data of the tables. The tables with no key are not listed"""
+_KEYS = {cls.data["table"] : cls.data["key"] for cls in _TABLES.values() if "key" in cls.data}
+
+class Relation:
+    """The rows of a table related to a row of another table, e.g. the levels of a nuclide
+
+    Declared once, it is compiled once into a sql with a ? placeholder for each key.
+    Following the relation from a row means executing the sql with the values of the row's key columns
+
+    Attributes:
+        table (str): what is selected, as in :py:meth:`ndlab._generator`, e.g. 'LEVEL' or 'L_DECAY.DAUGHTER.ALL'
+        keys (list): the fields matched with the keys, e.g. ['LEVEL.NUC_ID']
+        source (list): the columns of the related row giving the keys, e.g. ['nucid']
+        order (str): the fields to order by, e.g. 'LEVEL.SEQNO'
+        entity (str): the name of the class the rows are turned into, for the user of the relation
+    """
+
+    def __init__(self, table, keys, source, order = "", entity = None):
+        self.table = table
+        self.keys = keys
+        self.source = source
+        self.order = order
+        self.entity = entity
+        self._sql = None
+
+    @property
+    def fields(self):
+        return self.table if self.table.endswith("ALL") else self.table + ".*"
+
+    @property
+    def columns(self):
+        """The columns of the related rows matched with the keys, e.g. ['nucid'], to tell which row is related to which.
+        None when the keys are not columns of what is selected, e.g. for 'L_DECAY.DAUGHTER.ALL'
+        """
+        columns = []
+        for key in self.keys:
+            table, name = key.split(".")
+            attr = getattr(_TABLES[table], name, None)
+            if(table != self.table or attr.__class__ is not Column): return None
+            columns.append(attr.data["column"])
+        return columns
+
+    @property
+    def filter(self):
+        """The conditions, with placeholders for the keys
+        """
+        return " and ".join([key + " = ?" for key in self.keys]) + ((" ORDER BY " + self.order) if self.order != "" else "")
+
+    def sql(self):
+        """The compiled sql
+        """
+        if(self._sql == None):
+            self._sql = Sqlbuilder().query_build(self.fields, self.filter)
+        return self._sql
+
+def _column_path(cls, column):
+    """The field of a class for a column, e.g. LEVEL, 'l_seqno' -> 'LEVEL.SEQNO'
+    """
+    for name in dir(cls):
+        attr = getattr(cls, name)
+        if(attr.__class__ is Column and attr.data["column"] == column):
+            return cls.__name__ + "." + name
+    raise ValueError("no field of " + cls.__name__ + " for the column " + column)
+
+"""The start of the sql selecting all the columns of a table, see project"""
+_SELECT_ALL = re.compile(r"select (distinct )?(\w+)\.\* from ")
+
+def project(sql, columns):
+    """The sql of a query on 'TABLE.*' selecting only some columns of the table, e.g. two columns of a wide table
+
+    With DISTINCT the key of the table, or its rowid when it has none, is selected too:
+    the rows that differ only in the columns left out are all kept, as when selecting all of them
+
+    Args:
+        sql (str): the sql, as given by :py:meth:`Sqlbuilder.query_build` for 'TABLE.*'
+        columns (list): the columns of the table to select
+
+    Returns:
+        str: the sql, unchanged when it does not select all the columns of a table
+    """
+    match = _SELECT_ALL.match(sql)
+    if(match == None): return sql
+    distinct, table = match.group(1), match.group(2)
+    if(distinct or len(columns) == 0):
+        columns = _unique(_KEYS.get(table, ["rowid"]) + list(columns))
+    return "select " + (distinct or "") + ", ".join([table + "." + column for column in columns]) + " from " + sql[match.end():]
+
+def fk_relation(owner, name, reverse = False, order = "", entity = None):
+    """The :py:class:`Relation` of a foreign key, from its metadata
+
+    Args:
+        owner (class): the class with the foreign key, e.g. GAMMA
+        name (str): the name of the foreign key, e.g. 'END_LEVEL'
+        reverse (bool): False, from a row of owner to the row it links to, e.g. from a gamma to its end level.
+                        True, from a row of the linked table to the rows of owner linking to it, e.g. from a level to the gammas ending there
+        order (str): the fields to order by
+        entity (str): see :py:class:`Relation`
+
+    Returns:
+        Relation: the relation
+    """
+    fk = getattr(owner, name)
+    local = [pair[0] for pair in _pairs(fk)]
+    remote = [pair[1] for pair in _pairs(fk)]
+
+    if(reverse):
+        return Relation(owner.__name__, [_column_path(owner, c) for c in local], remote, order, entity)
+
+    target = fk.__class__
+    return Relation(target.__name__, [_column_path(target, c) for c in remote], local, order, entity)
+
 def get_const():
       
         import ndlabdblink as dl